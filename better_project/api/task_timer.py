@@ -1,11 +1,15 @@
 # better_project/api/task_timer.py
 import frappe
-from frappe.utils import now, get_datetime, now_datetime, time_diff_in_hours, format_duration
+from frappe.utils import add_days, now, get_datetime, now_datetime, time_diff_in_hours, format_duration, getdate
 from frappe import _
-from better_project.doctype.task.task import Task
+from better_project import employee_context, queries, realtime, task_assignees, timer_registry, timers
+from better_project.doctype.task.task import Task, get_navbar_state
+
+# Default range of get_user_timesheets; older timesheets are never listed in one go
+TIMESHEET_LOOKBACK_DAYS = 31
 
 @frappe.whitelist()
-def start_timer(task):
+def start_timer(task, include_navbar_state=0):
     """شروع Timer برای یک Task"""
     try:
         user = frappe.session.user
@@ -19,37 +23,20 @@ def start_timer(task):
         if not task_doc.project:
             return {"success": False, "error": "این تسک باید به یک پروژه متصل باشد"}
         
-        # بررسی و بستن همه Timer های فعال این کارمند
-        active_timers = frappe.db.sql("""
-            SELECT ts.name as timesheet, td.name as time_log, td.task, t.subject
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            JOIN `tabTask` t ON td.task = t.name
-            WHERE ts.employee = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            ORDER BY td.creation DESC
-        """, (employee,), as_dict=1)
-        
-        stopped_tasks = []
-        for timer in active_timers:
-            # بستن تایمر با استفاده از direct database update
-            frappe.db.set_value("Timesheet Detail", timer.time_log, {
-                "to_time": now(),
-                "hours": time_diff_in_hours(now(), timer.from_time)
-            })
-            stopped_tasks.append({
-                "task": timer.task,
-                "subject": timer.subject
-            })
+        # همه مراحل در یک تراکنش و با قفل کارمند انجام می‌شود
+        timers.lock_employee(employee)
         
-        if stopped_tasks:
-            frappe.db.commit()
+        # بستن همه Timer های فعال این کارمند با یک UPDATE
+        stopped_tasks = [
+            {"task": log.task, "subject": log.subject, "hours": log.hours}
+            for log in timers.close_open_timers(employee=employee, task_logs_only=True)
+        ]
         
         # پیدا کردن یا ایجاد Timesheet
         timesheet = get_or_create_timesheet(employee, task_doc.project)
         
         # اضافه کردن Time Log جدید با استفاده از direct database update
+        from_time = now()
         time_log = frappe.get_doc({
             "doctype": "Timesheet Detail",
             "parent": timesheet,
@@ -58,13 +45,16 @@ def start_timer(task):
             "activity_type": get_default_activity_type(),
             "task": task,
             "project": task_doc.project,
-            "from_time": now(),
+            "from_time": from_time,
             "description": f"کار روی تسک: {task_doc.subject}",
             "is_billable": task_doc.is_billable if hasattr(task_doc, "is_billable") else 0,
             "billing_hours": 0,
             "billing_amount": 0
         })
         time_log.insert()
+        task_assignees.add(task, user, task_assignees.TIMER)
+        timer_registry.invalidate(employee, [task])
+        realtime.publish_timer_started(employee, task, task_doc.subject, task_doc.project, from_time, stopped_tasks)
         frappe.db.commit()
         
         result = {
@@ -72,14 +62,18 @@ def start_timer(task):
             "stopped_tasks": stopped_tasks
         }
         
+        if frappe.utils.cint(include_navbar_state):
+            result["navbar_state"] = get_navbar_state()
+        
         return result
         
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(f"خطا در شروع Timer: {str(e)}")
         return {"success": False, "error": str(e)}
 
 @frappe.whitelist()
-def stop_timer(task):
+def stop_timer(task, include_navbar_state=0):
     """توقف Timer برای یک Task"""
     try:
         user = frappe.session.user
@@ -88,48 +82,43 @@ def stop_timer(task):
         if not employee:
             return {"success": False, "error": "کارمند مرتبط با این کاربر پیدا نشد"}
         
-        # پیدا کردن Time Log فعال برای این Task
-        active_log = frappe.db.sql("""
-            SELECT ts.name as timesheet, td.name as time_log, td.from_time, td.project
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            ORDER BY td.creation DESC
-            LIMIT 1
-        """, (employee, task), as_dict=1)
-        
-        if not active_log:
+        timers.lock_employee(employee)
+        if not _close_task_timers(employee, task):
+            frappe.db.rollback()
             return {"success": False, "error": "هیچ Timer فعالی برای این تسک پیدا نشد"}
         
-        # بستن Time Log با استفاده از direct database update
-        log = active_log[0]
-        to_time = now()
-        hours = time_diff_in_hours(to_time, log.from_time)
-        
-        frappe.db.set_value("Timesheet Detail", log.time_log, {
-            "to_time": to_time,
-            "hours": hours,
-            "billing_hours": hours
-        })
         frappe.db.commit()
         
-        return {"success": True}
+        result = {"success": True}
+        if frappe.utils.cint(include_navbar_state):
+            result["navbar_state"] = get_navbar_state()
+        
+        return result
         
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(f"خطا در توقف Timer: {str(e)}")
         return {"success": False, "error": str(e)}
 
 @frappe.whitelist()
-def complete_task(task):
-    """تکمیل Task و بستن Timer"""
+def complete_task(task, require_timer=1):
+    """تکمیل Task و بستن Timer
+
+    With ``require_timer=0`` the task is completed even when the user has no
+    timer running on it, as ``better_project.api.complete_task`` always did.
+    """
     try:
-        # ابتدا Timer را متوقف کن
-        stop_result = stop_timer(task)
-        if not stop_result.get("success"):
-            return stop_result
+        require_timer = frappe.utils.cint(require_timer)
+        employee = get_employee_by_user(frappe.session.user)
+        if not employee and require_timer:
+            return {"success": False, "error": "کارمند مرتبط با این کاربر پیدا نشد"}
+        
+        # ابتدا Timer را در همین تراکنش متوقف کن
+        if employee:
+            timers.lock_employee(employee)
+            if not _close_task_timers(employee, task) and require_timer:
+                frappe.db.rollback()
+                return {"success": False, "error": "هیچ Timer فعالی برای این تسک پیدا نشد"}
         
         # تکمیل Task
         task_doc = frappe.get_doc("Task", task)
@@ -138,11 +127,13 @@ def complete_task(task):
         task_doc.progress = 100
         task_doc.save()
         
+        realtime.publish_task_completed(task)
         frappe.db.commit()
         
         return {"success": True}
         
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(f"خطا در تکمیل Task: {str(e)}")
         return {"success": False, "error": str(e)}
 
@@ -150,25 +141,16 @@ def complete_task(task):
 def get_timer_status(task_name):
     """دریافت وضعیت زمان‌سنج برای یک تسک"""
     try:
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return {"is_running": False}
         
-        active_log = frappe.db.sql("""
-            SELECT td.from_time
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            LIMIT 1
-        """, (employee, task_name), as_dict=1)
+        active_log = timer_registry.get_active_timer(employee, task_name)
         
         if not active_log:
             return {"is_running": False}
             
-        start_time = get_datetime(active_log[0].from_time)
+        start_time = get_datetime(active_log.from_time)
         elapsed_time = time_diff_in_hours(now_datetime(), start_time)
         
         return {
@@ -184,40 +166,24 @@ def get_timer_status(task_name):
 def get_task_time_info(task_name):
     """دریافت اطلاعات زمانی یک تسک"""
     try:
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return None
         
         # Active time log
-        active_log = frappe.db.sql("""
-            SELECT td.from_time
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            LIMIT 1
-        """, (employee, task_name), as_dict=1)
+        active_log = timer_registry.get_active_timer(employee, task_name)
         
         # Total time
-        total_hours = frappe.db.sql("""
-            SELECT SUM(td.hours) as total_hours
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND ts.docstatus = 1
-        """, (employee, task_name))[0][0] or 0
+        total_hours = queries.get_task_hours(task_name, employee)
         
         result = {
             "total_time": total_hours,
             "total_time_formatted": format_duration(total_hours * 3600) if total_hours else "0 دقیقه",
-            "is_running": len(active_log) > 0
+            "is_running": bool(active_log)
         }
         
         if active_log:
-            start_time = get_datetime(active_log[0].from_time)
+            start_time = get_datetime(active_log.from_time)
             elapsed_seconds = (get_datetime(now_datetime()) - start_time).total_seconds()
             
             result.update({
@@ -242,40 +208,24 @@ def get_active_task_for_navbar():
             return None
         
         # Find active timesheet detail
-        active_log = frappe.db.sql("""
-            SELECT 
-                td.task,
-                td.from_time,
-                td.name as time_log,
-                ts.name as timesheet,
-                t.subject,
-                t.progress
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            JOIN `tabTask` t ON td.task = t.name
-            WHERE ts.employee = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            ORDER BY td.creation DESC
-            LIMIT 1
-        """, (employee,), as_dict=1)
+        task_log = timer_registry.get_active_timer(employee)
         
-        if not active_log:
+        if not task_log:
             return None
             
-        task_log = active_log[0]
+        task = frappe.get_cached_value("Task", task_log.task, ["subject", "progress"], as_dict=True)
         start_time = get_datetime(task_log.from_time)
         elapsed_time = time_diff_in_hours(now_datetime(), start_time)
         elapsed_minutes = int(elapsed_time * 60)
         
         return {
             "task_name": task_log.task,
-            "task_subject": task_log.subject,
+            "task_subject": task.subject,
             "project": task_log.project,
             "start_time": frappe.utils.format_datetime(start_time, "HH:mm:ss"),
             "elapsed_time": format_duration(elapsed_time),
             "elapsed_minutes": elapsed_minutes,
-            "progress": task_log.progress or 0
+            "progress": task.progress or 0
         }
         
     except Exception as e:
@@ -283,23 +233,28 @@ def get_active_task_for_navbar():
         return None
 
 # Helper Functions
+def _close_task_timers(employee, task):
+    """Close the open logs of an employee on a task without committing; returns False if none were open"""
+    closed = timers.close_open_timers(employee=employee, task=task)
+    if closed:
+        realtime.publish_timer_stopped(employee, task, sum(log.hours for log in closed))
+    return bool(closed)
+
 def get_employee_by_user(user):
     """Get employee linked to user"""
-    employee = frappe.db.get_value("Employee", {"user_id": user})
-    return employee
+    return employee_context.get_employee(user)
 
-def get_user_timesheets(employee):
-    """Get all timesheets for an employee"""
-    return frappe.db.get_list("Timesheet",
-        filters={"employee": employee},
-        pluck="name"
-    )
+def get_user_timesheets(employee, from_date=None, to_date=None):
+    """Timesheet names of an employee in a date range (default: the last TIMESHEET_LOOKBACK_DAYS days)"""
+    to_date = to_date or getdate()
+    from_date = from_date or add_days(to_date, -TIMESHEET_LOOKBACK_DAYS)
+    return [row.name for row in queries.get_employee_timesheets(employee, from_date, to_date)]
 
 def get_default_activity_type():
     """Get default activity type for time logs"""
-    employee = get_employee_by_user(frappe.session.user)
-    if employee:
-        activity_type = frappe.db.get_value("Employee", employee, "default_activity_type")
+    context = employee_context.get_employee_context()
+    if context:
+        activity_type = context.default_activity_type
         if not activity_type:
             frappe.throw("نوع فعالیت پیش‌فرض برای کارمند تنظیم نشده است. لطفا در پروفایل کارمند، نوع فعالیت پیش‌فرض را تنظیم کنید.")
         return activity_type
@@ -312,60 +267,21 @@ def get_default_activity_type():
 
 def stop_all_active_timers(employee):
     """Stop all active timers for an employee"""
-    active_logs = frappe.db.sql("""
-        SELECT ts.name as timesheet, td.name as time_log, td.task
-        FROM `tabTimesheet` ts
-        JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-        WHERE ts.employee = %s
-        AND td.to_time IS NULL
-        AND ts.docstatus = 0
-        ORDER BY td.creation DESC
-    """, (employee,), as_dict=1)
-    
-    stopped_task = None
-    for log in active_logs:
-        # Get the timesheet and time log
-        timesheet = frappe.get_doc("Timesheet", log.timesheet)
-        time_log = None
-        for tl in timesheet.time_logs:
-            if tl.name == log.time_log:
-                time_log = tl
-                break
-        
-        if time_log:
-            # Update time log directly in database to avoid validation
-            frappe.db.set_value("Timesheet Detail", time_log.name, {
-                "to_time": now(),
-                "hours": time_diff_in_hours(now(), time_log.from_time)
-            })
-            
-            if not stopped_task and log.task:
-                task_doc = frappe.get_doc("Task", log.task)
-                stopped_task = task_doc.subject
-    
-    if active_logs:
+    closed = timers.close_open_timers(employee=employee)
+    if closed:
         frappe.db.commit()
     
-    return stopped_task
+    return next((log.subject for log in closed if log.subject), None)
 
 def get_or_create_timesheet(employee, project):
     """Get or create a timesheet for today"""
     today = now_datetime().date()
     
     # Try to find existing timesheet
-    timesheet = frappe.db.get_list("Timesheet",
-        filters={
-            "employee": employee,
-            "start_date": ["<=", today],
-            "end_date": [">=", today],
-            "docstatus": ["!=", 2]
-        },
-        order_by="creation desc",
-        limit=1
-    )
+    timesheet = queries.get_current_timesheet(employee, today)
     
     if timesheet:
-        return timesheet[0].name
+        return timesheet
     
     # Create new timesheet with a default time log
     timesheet_doc = frappe.get_doc({
@@ -374,7 +290,7 @@ def get_or_create_timesheet(employee, project):
         "project": project,
         "start_date": today,
         "end_date": today,
-        "company": frappe.defaults.get_defaults().company,
+        "company": employee_context.get_employee_context().company,
         "time_logs": [{
             "activity_type": get_default_activity_type(),
             "from_time": now(),
@@ -385,6 +301,5 @@ def get_or_create_timesheet(employee, project):
     })
     
     timesheet_doc.insert()
-    frappe.db.commit()
     
     return timesheet_doc.name 
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""Benchmarks for the app's hot paths.
+
+``data`` generates a deterministic synthetic data set, ``endpoints`` measures
+every whitelisted timer and Task endpoint against it and ``timesheet_lookups``
+times timesheet lookups against growing histories. Results are plain dicts
+(JSON files for the endpoint suite) so runs on different revisions can be
+compared. They are run through bench commands (see
+``better_project.commands``) and only ever on a test site.
+"""
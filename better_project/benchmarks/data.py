@@ -0,0 +1,219 @@
+"""Deterministic synthetic data for the benchmarks.
+
+``generate`` seeds employees with their users, projects, tasks assigned to
+the employees and, for every working day of the last ``years`` years, one
+timesheet per employee with a few closed time logs; today's timesheet is a
+draft, older ones are submitted. Rows are bulk inserted without validation,
+the same parameters always produce the same rows, and every name starts with
+``PREFIX`` (users end with ``USER_DOMAIN``) so ``clear`` can remove them. The
+daily rollup and the task-assignee index are filled for the new employees.
+"""
+
+import json
+import random
+
+import frappe
+from frappe.utils import add_days, add_to_date, get_datetime, getdate
+
+from better_project import employee_context, queries, task_assignees, time_rollup, timer_registry
+
+PREFIX = "BENCH-"
+USER_DOMAIN = "@bench.example.com"
+# Parameters of the data set on the site, so a run can reuse it
+PARAMS_KEY = "better_project_benchmark_data"
+
+DEFAULTS = {
+    "employees": 5,
+    "projects": 4,
+    "tasks_per_project": 12,
+    "years": 2,
+    "logs_per_day": 3,
+    "seed": 42
+}
+
+ROLES = ("Employee", "Projects User")
+
+
+def ensure(**params):
+    """Generate the data set unless the same one is already on the site; returns its parameters"""
+    params = {**DEFAULTS, **{key: value for key, value in params.items() if value is not None}}
+    marker = json.dumps(params, sort_keys=True)
+    if frappe.db.get_global(PARAMS_KEY) == marker:
+        return params
+
+    clear()
+    generate(**params)
+    frappe.db.set_global(PARAMS_KEY, marker)
+    frappe.db.commit()
+    return params
+
+
+def get_employees():
+    """Generated employees with their users, in order"""
+    return frappe.get_all(
+        "Employee",
+        filters={"name": ["like", PREFIX + "%"]},
+        fields=["name", "user_id"],
+        order_by="name"
+    )
+
+
+def get_assigned_tasks(user):
+    """Open tasks assigned to a generated user, in order"""
+    return frappe.db.sql(f"""
+        SELECT task.name
+        FROM `{queries.TASK_ASSIGNEE_TABLE}` assignee
+        JOIN `tabTask` task ON task.name = assignee.task
+        WHERE assignee.user = %s
+        AND task.status != 'Completed'
+        ORDER BY task.name
+    """, (user,), pluck=True)
+
+
+def generate(employees, projects, tasks_per_project, years, logs_per_day, seed):
+    """Insert the data set; see the module docstring"""
+    rng = random.Random(seed)
+    today = getdate()
+    company = frappe.defaults.get_global_default("company") or frappe.db.get_value("Company", {}, "name")
+    activity_type = frappe.db.get_value("Activity Type", {}, "name")
+    created = get_datetime(add_days(today, -years * 365))
+    owner = "Administrator"
+
+    def stamp(row):
+        return row + (created, created, owner, owner)
+
+    stamp_fields = ["creation", "modified", "owner", "modified_by"]
+
+    project_names = [f"{PREFIX}PROJ-{i:03d}" for i in range(1, projects + 1)]
+    frappe.db.bulk_insert(
+        "Project",
+        ["name", "project_name", "status", "is_active", "company"] + stamp_fields,
+        [stamp((name, name, "Open", "Yes", company)) for name in project_names]
+    )
+
+    tasks_by_project = {}
+    task_rows = []
+    for project in project_names:
+        tasks_by_project[project] = []
+        for i in range(1, tasks_per_project + 1):
+            name = f"{project}-T{i:03d}"
+            start = add_days(today, -rng.randint(0, 60))
+            end = add_days(start, rng.randint(1, 90))
+            status = rng.choice(("Open", "Working", "Working", "Completed"))
+            tasks_by_project[project].append(name)
+            task_rows.append(stamp((
+                name, f"Benchmark task {name}", project, status, rng.choice(("Low", "Medium", "High")),
+                start, end, 100 if status == "Completed" else rng.randint(0, 90), 0, 0, 0
+            )))
+    frappe.db.bulk_insert(
+        "Task",
+        ["name", "subject", "project", "status", "priority", "exp_start_date", "exp_end_date",
+         "progress", "is_group", "lft", "rgt"] + stamp_fields,
+        task_rows
+    )
+
+    user_rows, role_rows, employee_rows, todo_rows = [], [], [], []
+    timesheet_rows, time_log_rows = [], []
+    for index in range(1, employees + 1):
+        user = f"bench-user-{index:04d}{USER_DOMAIN}"
+        employee = f"{PREFIX}EMP-{index:04d}"
+        first_name = f"Bench {index:04d}"
+        user_rows.append(stamp((user, user, first_name, first_name, 1, "System User")))
+        role_rows.extend(
+            stamp((f"{PREFIX}{index:04d}-{role}", user, "User", "roles", role))
+            for role in ROLES
+        )
+        employee_rows.append(stamp((
+            employee, first_name, first_name, user, company, "Active", "Male",
+            "1990-01-01", add_days(today, -years * 365)
+        )))
+
+        tasks = [
+            task
+            for project in rng.sample(project_names, min(2, len(project_names)))
+            for task in tasks_by_project[project]
+        ]
+        for task in tasks:
+            todo_rows.append(stamp((f"{PREFIX}TODO-{index:04d}-{task}", user, "Task", task, "Open", task)))
+
+        for offset in range(years * 365, -1, -1):
+            day = add_days(today, -offset)
+            if day.weekday() >= 5 and offset:
+                continue
+            timesheet = f"{PREFIX}TS-{index:04d}-{day:%Y%m%d}"
+            from_time = get_datetime(f"{day} 09:00:00")
+            total = 0
+            for idx in range(1, logs_per_day + 1):
+                task = rng.choice(tasks)
+                hours = rng.choice((0.5, 1, 1.5, 2, 3))
+                to_time = add_to_date(from_time, hours=hours)
+                time_log_rows.append(stamp((
+                    f"{timesheet}-{idx}", timesheet, "Timesheet", "time_logs", idx, activity_type,
+                    task, task.rsplit("-T", 1)[0], from_time, to_time, hours, hours, f"Benchmark log {idx}"
+                )))
+                from_time = to_time
+                total += hours
+            timesheet_rows.append(stamp((
+                timesheet, employee, company, day, day, 0 if offset == 0 else 1, total
+            )))
+
+    frappe.db.bulk_insert(
+        "User",
+        ["name", "email", "first_name", "full_name", "enabled", "user_type"] + stamp_fields,
+        user_rows
+    )
+    frappe.db.bulk_insert(
+        "Has Role",
+        ["name", "parent", "parenttype", "parentfield", "role"] + stamp_fields,
+        role_rows
+    )
+    frappe.db.bulk_insert(
+        "Employee",
+        ["name", "first_name", "employee_name", "user_id", "company", "status", "gender",
+         "date_of_birth", "date_of_joining"] + stamp_fields,
+        employee_rows
+    )
+    frappe.db.bulk_insert(
+        "ToDo",
+        ["name", "allocated_to", "reference_type", "reference_name", "status", "description"] + stamp_fields,
+        todo_rows
+    )
+    frappe.db.bulk_insert(
+        "Timesheet",
+        ["name", "employee", "company", "start_date", "end_date", "docstatus", "total_hours"] + stamp_fields,
+        timesheet_rows
+    )
+    frappe.db.bulk_insert(
+        "Timesheet Detail",
+        ["name", "parent", "parenttype", "parentfield", "idx", "activity_type", "task", "project",
+         "from_time", "to_time", "hours", "billing_hours", "description"] + stamp_fields,
+        time_log_rows
+    )
+
+    for row in todo_rows:
+        task_assignees.add(row[3], row[1], task_assignees.ASSIGNMENT)
+    for row in employee_rows:
+        time_rollup.rebuild(row[0])
+
+
+def clear():
+    """Delete the generated data set and anything the benchmarks created for it"""
+    like = PREFIX + "%"
+    for employee in get_employees():
+        employee_context.invalidate(employee.user_id)
+        timer_registry.invalidate(employee.name)
+
+    frappe.db.sql("""
+        DELETE td FROM `tabTimesheet Detail` td
+        JOIN `tabTimesheet` ts ON ts.name = td.parent
+        WHERE ts.employee LIKE %s
+    """, (like,))
+    frappe.db.sql("DELETE FROM `tabTimesheet` WHERE employee LIKE %s", (like,))
+    for doctype in ("Task", "Project", "Employee"):
+        frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE name LIKE %s", (like,))
+    frappe.db.sql("DELETE FROM `tabToDo` WHERE reference_type = 'Task' AND reference_name LIKE %s", (like,))
+    frappe.db.sql("DELETE FROM `tabHas Role` WHERE parent LIKE %s", ("%" + USER_DOMAIN,))
+    frappe.db.sql("DELETE FROM `tabUser` WHERE name LIKE %s", ("%" + USER_DOMAIN,))
+    frappe.db.sql(f"DELETE FROM `{queries.TIME_ROLLUP_TABLE}` WHERE employee LIKE %s", (like,))
+    frappe.db.sql(f"DELETE FROM `{queries.TASK_ASSIGNEE_TABLE}` WHERE task LIKE %s", (like,))
+    frappe.db.set_global(PARAMS_KEY, "")
@@ -0,0 +1,191 @@
+"""Cost of every whitelisted timer and Task endpoint on a synthetic data set.
+
+The first generated employee calls each whitelisted function of ``MODULES``
+directly, ``repeat`` times, against the data set of ``data.ensure``. Each
+call is measured for wall time, the number of ``frappe.db.sql`` calls and the
+rows the server examined (the session's ``Handler_read_*`` counters).
+``start_timer`` runs first in each round so the read endpoints see a running
+timer, and the stop and complete endpoints run last.
+
+Results are plain JSON (see ``write_results``); ``compare`` lists the
+endpoints that got slower or heavier than a baseline file, which is what
+``bench --site <site> benchmark-endpoints --baseline <file>`` fails on.
+"""
+
+import importlib
+import inspect
+import json
+import statistics
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import now
+
+from better_project.benchmarks import data
+
+MODULES = ("better_project.api.task_timer", "better_project.doctype.task.task")
+# Debug helpers that the UI never calls
+SKIP = {"test_task_methods"}
+FIRST = ("start_timer",)
+LAST = ("stop_timer", "complete_task")
+
+# A regression is a median wall time or rows examined this much above the
+# baseline (and above NOISE_MS for time), or any extra query
+TOLERANCE = 0.2
+NOISE_MS = 2
+
+
+def run(repeat=5, **params):
+    """Benchmark every endpoint and return the results as a JSON-ready dict"""
+    params = data.ensure(**params)
+    employee = data.get_employees()[0]
+    tasks = data.get_assigned_tasks(employee.user_id)
+    timer_task, completed_task = tasks[0], tasks[-1]
+    endpoints = get_endpoints()
+
+    samples = defaultdict(list)
+    frappe.set_user(employee.user_id)
+    try:
+        for _ in range(repeat):
+            for name, function in endpoints:
+                task = completed_task if function.__name__ == "complete_task" else timer_task
+                samples[name].append(measure(function, _arguments(function, task)))
+    finally:
+        frappe.set_user("Administrator")
+        # Leave the data set as it was generated for the next run
+        frappe.db.set_value("Task", completed_task, {"status": "Working", "progress": 0}, update_modified=False)
+        frappe.db.commit()
+
+    return {
+        "created": now(),
+        "site": frappe.local.site,
+        "params": params,
+        "repeat": repeat,
+        "endpoints": {name: summarize(runs) for name, runs in samples.items()}
+    }
+
+
+def get_endpoints():
+    """(module.function, function) of each whitelisted function in MODULES, in run order"""
+    endpoints = []
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            if function.__module__ != module_name or name in SKIP or not _is_whitelisted(function):
+                continue
+            endpoints.append((f"{module_name}.{name}", function))
+
+    def order(endpoint):
+        name = endpoint[1].__name__
+        if name in FIRST:
+            return (0, FIRST.index(name))
+        if name in LAST:
+            return (2, LAST.index(name))
+        return (1, 0)
+
+    return sorted(endpoints, key=order)
+
+
+def measure(function, kwargs):
+    """Wall time, query count, rows examined and error of one call"""
+    # Every call starts like a new request
+    frappe.local.cache = {}
+    rows_before = _rows_examined()
+    error = None
+    with _count_queries() as counter:
+        started = time.perf_counter()
+        try:
+            function(**kwargs)
+        except Exception as e:
+            error = str(e)
+            frappe.db.rollback()
+        elapsed = (time.perf_counter() - started) * 1000
+
+    return {
+        "wall_ms": elapsed,
+        "queries": counter["queries"],
+        "rows_examined": _rows_examined() - rows_before,
+        "error": error
+    }
+
+
+def summarize(runs):
+    wall = [run["wall_ms"] for run in runs]
+    return {
+        "wall_ms": round(statistics.median(wall), 3),
+        "wall_ms_max": round(max(wall), 3),
+        "queries": statistics.median(run["queries"] for run in runs),
+        "rows_examined": statistics.median(run["rows_examined"] for run in runs),
+        "errors": sorted({run["error"] for run in runs if run["error"]})
+    }
+
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True, default=str)
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    """Endpoints of ``current`` that regressed against ``baseline``, one dict per metric"""
+    regressions = []
+    for name, result in current["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        if result["wall_ms"] > before["wall_ms"] * (1 + tolerance) and result["wall_ms"] - before["wall_ms"] > NOISE_MS:
+            regressions.append({"endpoint": name, "metric": "wall_ms", "before": before["wall_ms"], "after": result["wall_ms"]})
+        if result["queries"] > before["queries"]:
+            regressions.append({"endpoint": name, "metric": "queries", "before": before["queries"], "after": result["queries"]})
+        if result["rows_examined"] > before["rows_examined"] * (1 + tolerance):
+            regressions.append({
+                "endpoint": name,
+                "metric": "rows_examined",
+                "before": before["rows_examined"],
+                "after": result["rows_examined"]
+            })
+    return regressions
+
+
+def _is_whitelisted(function):
+    return function in frappe.whitelisted or getattr(function, "__wrapped__", None) in frappe.whitelisted
+
+
+def _arguments(function, task):
+    """Keyword arguments for an endpoint: the task under test, defaults for the rest"""
+    values = {"task": task, "task_name": task}
+    return {
+        name: values[name]
+        for name in inspect.signature(inspect.unwrap(function)).parameters
+        if name in values
+    }
+
+
+def _rows_examined():
+    return sum(
+        int(row[1])
+        for row in frappe.db.sql("SHOW SESSION STATUS LIKE 'Handler_read%%'")
+    )
+
+
+@contextmanager
+def _count_queries():
+    """Count frappe.db.sql calls, including those of get_value, get_all and friends"""
+    counter = {"queries": 0}
+    sql = frappe.db.sql
+
+    def counting_sql(*args, **kwargs):
+        counter["queries"] += 1
+        return sql(*args, **kwargs)
+
+    frappe.db.sql = counting_sql
+    try:
+        yield counter
+    finally:
+        del frappe.db.sql
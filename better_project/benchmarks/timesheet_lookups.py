@@ -0,0 +1,104 @@
+"""Latency of timesheet lookups against the length of an employee's history.
+
+A synthetic employee gets, inside a transaction that is rolled back at the
+end, one timesheet with one time log per day, all
+submitted except today's draft whose log is still open. For growing histories
+two ways of finding the employee's current timesheet and open logs are timed:
+
+* ``unbounded``: the old pattern, every timesheet name of the employee and
+  then the time logs with ``parent IN (...)``;
+* ``bounded``: ``queries.get_current_timesheet``, the last month of
+  ``queries.get_employee_timesheets`` and the joined
+  ``queries.get_open_time_logs``.
+
+The bounded lookups should stay flat however many years are seeded. Run it
+with ``bench --site <site> benchmark-timesheet-lookups``.
+"""
+
+import statistics
+import time
+
+import frappe
+from frappe.utils import add_days, add_to_date, get_datetime, getdate, now_datetime
+
+from better_project import queries
+from better_project.benchmarks import data
+
+EMPLOYEE = f"{data.PREFIX}EMP-TIMESHEETS"
+HISTORY_DAYS = (30, 365, 3 * 365, 5 * 365)
+REPEAT = 20
+
+
+def run(history_days=HISTORY_DAYS, repeat=REPEAT):
+    """Time both lookups for each history length; returns one dict per length"""
+    results = []
+    seeded = 0
+    try:
+        for days in sorted(history_days):
+            _seed(seeded, days)
+            seeded = days
+            results.append({
+                "history_days": days,
+                "unbounded_ms": _median_ms(_unbounded, repeat),
+                "bounded_ms": _median_ms(_bounded, repeat)
+            })
+    finally:
+        frappe.db.rollback()
+    return results
+
+
+def _unbounded():
+    names = frappe.get_all("Timesheet", filters={"employee": EMPLOYEE}, pluck="name")
+    return frappe.get_all(
+        "Timesheet Detail",
+        filters={"parent": ["in", names], "to_time": ["is", "not set"]},
+        fields=["name", "parent", "task", "from_time"]
+    )
+
+
+def _bounded():
+    today = getdate()
+    queries.get_current_timesheet(EMPLOYEE, today)
+    queries.get_employee_timesheets(EMPLOYEE, add_days(today, -31), today)
+    return queries.get_open_time_logs(employee=EMPLOYEE)
+
+
+def _median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def _seed(from_offset, to_offset):
+    """Add the timesheets of the days from_offset (inclusive) to to_offset days ago"""
+    now = now_datetime()
+    user = frappe.session.user
+    timesheets = []
+    time_logs = []
+    for offset in range(from_offset, to_offset):
+        day = add_days(getdate(), -offset)
+        name = f"{EMPLOYEE}-{day}"
+        start = get_datetime(f"{day} 09:00:00")
+        draft = offset == 0
+        timesheets.append((name, EMPLOYEE, day, day, 0 if draft else 1, 0 if draft else 8, now, now, user, user))
+        time_logs.append((
+            f"{name}-1", name, "Timesheet", "time_logs", 1,
+            start, None if draft else add_to_date(start, hours=8), 0 if draft else 8,
+            now, now, user, user
+        ))
+
+    frappe.db.bulk_insert(
+        "Timesheet",
+        ["name", "employee", "start_date", "end_date", "docstatus", "total_hours",
+         "creation", "modified", "owner", "modified_by"],
+        timesheets
+    )
+    frappe.db.bulk_insert(
+        "Timesheet Detail",
+        ["name", "parent", "parenttype", "parentfield", "idx", "from_time", "to_time", "hours",
+         "creation", "modified", "owner", "modified_by"],
+        time_logs
+    )
@@ -0,0 +1,285 @@
+import click
+import frappe
+from frappe.commands import pass_context
+from frappe.exceptions import SiteNotSpecifiedError
+
+
+@click.command("rebuild-time-rollup")
+@click.option("--employee", help="Only rebuild rows of this employee")
+@click.option("--from-date", help="First work date to rebuild (YYYY-MM-DD)")
+@click.option("--to-date", help="Last work date to rebuild (YYYY-MM-DD)")
+@pass_context
+def rebuild_time_rollup(context, employee=None, from_date=None, to_date=None):
+    """Backfill or rebuild the daily time rollup from Timesheet Detail"""
+    from better_project import time_rollup
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            time_rollup.ensure_table()
+            employees = [employee] if employee else frappe.get_all("Employee", pluck="name")
+            # One transaction per employee keeps locks short on large histories
+            for name in employees:
+                time_rollup.rebuild(name, from_date, to_date)
+                frappe.db.commit()
+            click.echo(f"{site}: rebuilt time rollup for {len(employees)} employee(s)")
+        finally:
+            frappe.destroy()
+
+
+@click.command("rebuild-task-assignees")
+@pass_context
+def rebuild_task_assignees(context):
+    """Rebuild the task-assignee index from open ToDos and time logs"""
+    from better_project import task_assignees
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            task_assignees.ensure_table()
+            task_assignees.rebuild()
+            frappe.db.commit()
+            click.echo(f"{site}: rebuilt task-assignee index")
+        finally:
+            frappe.destroy()
+
+
+@click.command("reconcile-time-totals")
+@click.option("--fix", is_flag=True, default=False, help="Overwrite drifted totals with the logged hours")
+@pass_context
+def reconcile_time_totals(context, fix=False):
+    """Compare Task.actual_time and Timesheet.total_hours with the time logs"""
+    from better_project import time_totals
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            drift = time_totals.reconcile(fix=fix)
+            for row in drift:
+                click.echo(f"{site}: {row.doctype} {row.name}: stored {row.stored}, logged {row.logged}")
+            if fix:
+                frappe.db.commit()
+            click.echo(f"{site}: {len(drift)} drifted total(s){' fixed' if fix and drift else ''}")
+        finally:
+            frappe.destroy()
+
+
+@click.command("check-query-plans")
+@pass_context
+def check_query_plans(context):
+    """EXPLAIN the app's SQL and fail if a statement needs a full table scan"""
+    from better_project.query_plans import check_query_plans
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    failed = False
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            for problem in check_query_plans():
+                failed = True
+                if problem.get("error"):
+                    click.echo(f"{site}: {problem['source']} cannot be checked: {problem['error']}")
+                    continue
+                click.echo(f"{site}: {problem['source']} scans `{problem['table']}` without an index")
+        finally:
+            frappe.destroy()
+
+    if failed:
+        raise SystemExit(1)
+    click.echo("All query plans use an index")
+
+
+@click.command("stress-timer-switch")
+@click.option("--user", required=True, help="User whose employee switches timers")
+@click.option("--threads", default=4, type=int, help="Concurrent callers, like open browser tabs")
+@click.option("--iterations", default=25, type=int, help="Timer switches per thread")
+@click.option("--tasks", default=5, type=int, help="Number of tasks to switch between")
+@pass_context
+def stress_timer_switch(context, user, threads=4, iterations=25, tasks=5):
+    """Switch timers from several threads and check the one-open-timer rule"""
+    from better_project import timer_stress
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    failed = False
+    for site in context.sites:
+        summary = timer_stress.run(site, user, threads, iterations, tasks)
+        click.echo(
+            f"{site}: {summary['switches']} switches in {summary['seconds']:.2f}s "
+            f"({summary['switches_per_second']:.1f}/s), {len(summary['errors'])} error(s)"
+        )
+        for violation in summary["violations"]:
+            failed = True
+            click.echo(f"{site}: {violation}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+@click.command("benchmark-timesheet-lookups")
+@click.option("--days", default="30,365,1095,1825", help="Comma-separated history lengths in days")
+@click.option("--repeat", default=20, type=int, help="Runs per lookup; the median is reported")
+@pass_context
+def benchmark_timesheet_lookups(context, days="30,365,1095,1825", repeat=20):
+    """Time timesheet lookups against years of synthetic daily timesheets (rolled back)"""
+    from better_project.benchmarks import timesheet_lookups
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    history_days = [int(value) for value in days.split(",") if value.strip()]
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            for row in timesheet_lookups.run(history_days, repeat):
+                click.echo(
+                    f"{site}: {row['history_days']} days: unbounded {row['unbounded_ms']:.2f} ms, "
+                    f"bounded {row['bounded_ms']:.2f} ms"
+                )
+        finally:
+            frappe.destroy()
+
+
+@click.command("benchmark-endpoints")
+@click.option("--employees", type=int, help="Generated employees")
+@click.option("--projects", type=int, help="Generated projects")
+@click.option("--tasks-per-project", type=int, help="Generated tasks per project")
+@click.option("--years", type=int, help="Years of daily timesheets per employee")
+@click.option("--seed", type=int, help="Random seed of the generator")
+@click.option("--repeat", default=5, type=int, help="Calls per endpoint; medians are reported")
+@click.option("--output", help="JSON results file (default: benchmark-<site>.json)")
+@click.option("--baseline", help="Earlier results file; fail if an endpoint regressed against it")
+@click.option("--clear", is_flag=True, default=False, help="Delete the generated data afterwards")
+@pass_context
+def benchmark_endpoints(context, employees=None, projects=None, tasks_per_project=None, years=None,
+        seed=None, repeat=5, output=None, baseline=None, clear=False):
+    """Measure every whitelisted timer endpoint on a generated data set (test sites only)"""
+    from better_project.benchmarks import data, endpoints
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    failed = False
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            results = endpoints.run(
+                repeat,
+                employees=employees,
+                projects=projects,
+                tasks_per_project=tasks_per_project,
+                years=years,
+                seed=seed
+            )
+            path = output or f"benchmark-{site}.json"
+            endpoints.write_results(results, path)
+            for name, result in results["endpoints"].items():
+                click.echo(
+                    f"{site}: {name}: {result['wall_ms']:.2f} ms, {result['queries']} queries, "
+                    f"{result['rows_examined']} rows examined{' (errors)' if result['errors'] else ''}"
+                )
+            click.echo(f"{site}: results written to {path}")
+
+            if baseline:
+                for regression in endpoints.compare(endpoints.read_results(baseline), results):
+                    failed = True
+                    click.echo(
+                        f"{site}: {regression['endpoint']}: {regression['metric']} "
+                        f"{regression['before']} -> {regression['after']}"
+                    )
+            if clear:
+                data.clear()
+                frappe.db.commit()
+        finally:
+            frappe.destroy()
+
+    if failed:
+        raise SystemExit(1)
+
+
+@click.command("endpoint-timings")
+@click.option("--hours", default=24, type=int, help="How many past hours to include")
+@pass_context
+def endpoint_timings(context, hours=24):
+    """Show per-endpoint query counts and timings recorded by request_timing"""
+    from better_project import request_timing
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            for row in request_timing.get_stats(hours):
+                click.echo(
+                    f"{site}: {row.method}: {row.calls} calls, avg {row.avg_total_ms} ms "
+                    f"({row.avg_db_ms} ms in {row.avg_queries} queries), {row.commits:g} commits"
+                )
+        finally:
+            frappe.destroy()
+
+
+@click.command("slow-queries")
+@click.option("--clear", is_flag=True, default=False, help="Empty the log after showing it")
+@pass_context
+def slow_queries(context, clear=False):
+    """Show the slow query log of better_project grouped by call site"""
+    from better_project import slow_queries as slow_query_log
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            if not slow_query_log.get_threshold_ms():
+                click.echo(f"{site}: capture is off; set better_project_slow_query_ms in site_config")
+            for group in slow_query_log.get_report():
+                click.echo(
+                    f"{site}: {group.caller}: {group.count}x, avg {group.avg_ms} ms, "
+                    f"max {group.max_ms} ms, last at {group.last_at}"
+                )
+                click.echo(f"    {' '.join(group.query.split())[:300]}")
+                click.echo(f"    values: {group.values[:300]}")
+                for row in group.plan if isinstance(group.plan, list) else []:
+                    click.echo(
+                        f"    plan: {row['table']} type={row['type']} key={row['key']} "
+                        f"rows={row['rows']} {row['Extra'] or ''}"
+                    )
+            if clear:
+                slow_query_log.clear()
+        finally:
+            frappe.destroy()
+
+
+commands = [
+    rebuild_time_rollup,
+    rebuild_task_assignees,
+    reconcile_time_totals,
+    check_query_plans,
+    stress_timer_switch,
+    benchmark_timesheet_lookups,
+    benchmark_endpoints,
+    endpoint_timings,
+    slow_queries
+]
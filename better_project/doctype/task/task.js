@@ -75,6 +75,7 @@ better_project.task.TaskTimer = class TaskTimer {
                 }
             });
 
+            this.destroy();
             this.timer_display.hide();
             this.wrapper.cur_frm.toggle_display('start_timer', true);
             this.wrapper.cur_frm.toggle_display('stop_timer', false);
@@ -99,6 +100,7 @@ better_project.task.TaskTimer = class TaskTimer {
                 }
             });
 
+            this.destroy();
             this.timer_display.hide();
             this.wrapper.cur_frm.toggle_display('start_timer', false);
             this.wrapper.cur_frm.toggle_display('stop_timer', false);
@@ -117,20 +119,18 @@ better_project.task.TaskTimer = class TaskTimer {
     update_timer_display() {
         if (!this.start_time) return;
         
-        const update_timer = () => {
-            const now = new Date();
-            const diff = now - this.start_time;
-            const hours = Math.floor(diff / 3600000);
-            const minutes = Math.floor((diff % 3600000) / 60000);
-            const seconds = Math.floor((diff % 60000) / 1000);
-            
-            this.timer_display.find('.timer-value').text(
-                `${hours.toString().padStart(2, '0')}:${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`
-            );
-        };
-        
-        update_timer();
-        this.timer_interval = setInterval(update_timer, 1000);
+        // One subscription to the shared ticker per widget
+        this.destroy();
+        this.stop_ticker = better_project.ticker.subscribe(now => {
+            this.timer_display.find('.timer-value').text(better_project.ticker.format(now - this.start_time));
+        }, this.timer_display);
+    }
+
+    destroy() {
+        if (this.stop_ticker) {
+            this.stop_ticker();
+            this.stop_ticker = null;
+        }
     }
 
     async start_timer_check() {
@@ -218,22 +218,11 @@ frappe.navbar.update_task_indicator = function(task) {
     this.task_indicator.show();
     
     // Start timer update
-    if (!this.task_timer_interval) {
+    if (!this.stop_task_ticker) {
         const start_time = new Date(task.start_time);
-        const update_timer = () => {
-            const now = new Date();
-            const diff = now - start_time;
-            const hours = Math.floor(diff / 3600000);
-            const minutes = Math.floor((diff % 3600000) / 60000);
-            const seconds = Math.floor((diff % 60000) / 1000);
-            
-            this.task_indicator.find('.task-timer').text(
-                `${hours.toString().padStart(2, '0')}:${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`
-            );
-        };
-        
-        update_timer();
-        this.task_timer_interval = setInterval(update_timer, 1000);
+        this.stop_task_ticker = better_project.ticker.subscribe(now => {
+            this.task_indicator.find('.task-timer').text(better_project.ticker.format(now - start_time));
+        });
     }
 };
 
@@ -241,15 +230,18 @@ frappe.navbar.clear_task_indicator = function() {
     if (this.task_indicator) {
         this.task_indicator.hide();
     }
-    if (this.task_timer_interval) {
-        clearInterval(this.task_timer_interval);
-        this.task_timer_interval = null;
+    if (this.stop_task_ticker) {
+        this.stop_task_ticker();
+        this.stop_task_ticker = null;
     }
 };
 
 // Initialize task timer when form loads
 frappe.ui.form.on('Task', {
     refresh: function(frm) {
-        new better_project.task.TaskTimer(frm);
+        if (frm.task_timer_widget) {
+            frm.task_timer_widget.destroy();
+        }
+        frm.task_timer_widget = new better_project.task.TaskTimer(frm);
     }
 }); 
\ No newline at end of file
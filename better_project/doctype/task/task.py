@@ -1,11 +1,13 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import now_datetime, getdate, time_diff_in_hours, format_duration, now, get_datetime, today
-from datetime import timedelta
+from frappe.utils import now_datetime, getdate, time_diff_in_hours, format_duration, now, get_datetime, today, add_days, flt
+from datetime import datetime, timedelta
 from erpnext.projects.doctype.timesheet.timesheet import Timesheet
 import random
 
+from better_project import employee_context, navbar_versions, notifications, queries, task_assignees, team_board, timer_registry, timers
+
 class Task(Document):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -27,14 +29,7 @@ class Task(Document):
         if self.is_new():
             return
             
-        active_task = frappe.db.sql("""
-            SELECT name, subject 
-            FROM `tabTask` 
-            WHERE docstatus = 0 
-            AND status != 'Completed'
-            AND _user_tags LIKE %s
-            AND name != %s
-        """, (f'%{frappe.session.user}%', self.name), as_dict=1)
+        active_task = queries.get_tagged_open_tasks(frappe.session.user, self.name)
         
         if active_task:
             frappe.throw(_("شما در حال حاضر یک زمان‌سنج فعال روی تسک '{0}' دارید").format(
@@ -46,7 +41,10 @@ class Task(Document):
         if not self.project:
             frappe.throw(_("لطفا یک پروژه برای این تسک انتخاب کنید"))
             
-        # Stop any existing timer
+        # Stop any existing timer; the employee lock is held until the commit below
+        employee = employee_context.get_employee()
+        if employee:
+            timers.lock_employee(employee)
         stopped_task = self.stop_all_active_timers()
         
         # Create or get timesheet
@@ -64,8 +62,8 @@ class Task(Document):
         })
         timesheet_doc.save()
         
-        # Update task
-        self.db_set("_user_tags", frappe.session.user)
+        # Index the task under the user without touching their tags
+        task_assignees.add(self.name, frappe.session.user, task_assignees.TIMER)
         frappe.db.commit()
         
         return {
@@ -76,36 +74,16 @@ class Task(Document):
     
     def stop_timer(self):
         """Stop timer for the task"""
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return {"success": False, "error": "هیچ کارمندی برای این کاربر پیدا نشد"}
             
-        # Find active time log
-        active_log = frappe.db.sql("""
-            SELECT ts.name as timesheet, td.name as time_log, td.from_time
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-        """, (employee, self.name), as_dict=1)
-        
-        if not active_log:
+        # Close the active time logs of this task
+        timers.lock_employee(employee)
+        if not timers.close_open_timers(employee=employee, task=self.name):
             return {"success": False, "has_active_timer": False}
-            
-        # Update time log
-        to_time = now_datetime()
-        hours = time_diff_in_hours(to_time, active_log[0].from_time)
-        frappe.db.set_value("Timesheet Detail", active_log[0].time_log, {
-            "to_time": to_time,
-            "hours": hours,
-            "billing_hours": hours
-        })
-        
-        # Recalculate and update task's actual_time
-        self.update_actual_time_from_timesheets()
         
+        # actual_time is recomputed in the background
         frappe.db.commit()
         
         return {"success": True, "has_active_timer": True}
@@ -132,17 +110,11 @@ class Task(Document):
     
     def get_active_timesheet(self):
         """Get active timesheet for current user and project"""
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return None
             
-        return frappe.db.get_value("Timesheet", {
-            "employee": employee,
-            "project": self.project,
-            "docstatus": 0,
-            "start_date": ["<=", getdate()],
-            "end_date": [">=", getdate()]
-        })
+        return queries.get_current_timesheet(employee, getdate(), self.project)
     
     def get_or_create_timesheet(self):
         """Get or create timesheet for current user and project"""
@@ -150,18 +122,18 @@ class Task(Document):
         if timesheet:
             return frappe.get_doc("Timesheet", timesheet)
             
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
-        if not employee:
+        context = employee_context.get_employee_context()
+        if not context:
             frappe.throw(_("هیچ کارمندی برای این کاربر پیدا نشد"))
             
         timesheet = frappe.get_doc({
             "doctype": "Timesheet",
-            "employee": employee,
+            "employee": context.employee,
             "project": self.project,
             "start_date": getdate(),
             "end_date": getdate(),
-            "title": f"جدول زمانی {frappe.get_value('Employee', employee, 'employee_name')}",
-            "company": frappe.defaults.get_defaults().company,
+            "title": f"جدول زمانی {context.employee_name}",
+            "company": context.company,
             "time_logs": [{
                 "activity_type": self.get_default_activity_type(),
                 "from_time": now_datetime(),
@@ -175,42 +147,18 @@ class Task(Document):
 
     def stop_all_active_timers(self):
         """Stop all active timers for current user"""
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return None
             
-        # Find all active time logs
-        active_logs = frappe.db.sql("""
-            SELECT ts.name as timesheet, td.name as time_log, td.task
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-        """, (employee,), as_dict=1)
-        
-        stopped_task = None
-        for log in active_logs:
-            timesheet = frappe.get_doc("Timesheet", log.timesheet)
-            time_log = timesheet.get("time_logs", {"name": log.time_log})[0]
-            time_log.to_time = now_datetime()
-            time_log.hours = time_diff_in_hours(time_log.to_time, time_log.from_time)
-            timesheet.save()
-            
-            if not stopped_task:
-                task_doc = frappe.get_doc("Task", log.task)
-                stopped_task = task_doc.subject
-        
-        frappe.db.commit()
-        return stopped_task
+        closed = timers.close_open_timers(employee=employee)
+        return next((log.subject for log in closed if log.subject), None)
 
     def get_default_activity_type(self):
         """Get default activity type"""
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
-        if employee:
-            activity_type = frappe.db.get_value("Employee", employee, "default_activity_type")
-            if activity_type:
-                return activity_type
+        context = employee_context.get_employee_context()
+        if context and context.default_activity_type:
+            return context.default_activity_type
         
         # Fallback to first available activity type
         activity_type = frappe.db.get_value("Activity Type", {}, "name")
@@ -224,16 +172,10 @@ class Task(Document):
 
     def update_actual_time_from_timesheets(self):
         """Calculate total actual time from linked timesheet details and update task"""
-        total_actual_time = frappe.db.sql("""
-            SELECT SUM(td.hours)
-            FROM `tabTimesheet Detail` td
-            JOIN `tabTimesheet` ts ON ts.name = td.parent
-            WHERE td.task = %s
-            AND ts.docstatus = 1 -- Only sum from submitted timesheets
-        """, (self.name))[0][0] or 0
+        # Only sum from submitted timesheets
+        total_actual_time = queries.get_task_hours(self.name)
         
         self.db_set("actual_time", total_actual_time)
-        frappe.db.commit()
 
 @frappe.whitelist()
 def start_timer(task_name):
@@ -279,22 +221,13 @@ def complete_task(task_name):
 def get_timer_status(task_name):
     """Get timer status for task"""
     try:
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return {"is_running": False}
         
-        active_log = frappe.db.sql("""
-            SELECT td.from_time
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            LIMIT 1
-        """, (employee, task_name), as_dict=1)
+        active_log = timer_registry.get_active_timer(employee, task_name)
         
-        return {"is_running": len(active_log) > 0}
+        return {"is_running": bool(active_log)}
         
     except Exception as e:
         frappe.log_error(f"خطا در دریافت وضعیت زمان‌سنج: {str(e)}")
@@ -304,40 +237,24 @@ def get_timer_status(task_name):
 def get_task_time_info(task_name):
     """Get time information for task"""
     try:
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user})
+        employee = employee_context.get_employee()
         if not employee:
             return None
         
         # Active time log
-        active_log = frappe.db.sql("""
-            SELECT td.from_time
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-            LIMIT 1
-        """, (employee, task_name), as_dict=1)
+        active_log = timer_registry.get_active_timer(employee, task_name)
         
         # Total time
-        total_hours = frappe.db.sql("""
-            SELECT SUM(td.hours) as total_hours
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND td.task = %s
-            AND ts.docstatus = 1
-        """, (employee, task_name))[0][0] or 0
+        total_hours = queries.get_task_hours(task_name, employee)
         
         result = {
             "total_time": total_hours,
             "total_time_formatted": format_duration(total_hours * 3600) if total_hours else "0 دقیقه",
-            "is_running": len(active_log) > 0
+            "is_running": bool(active_log)
         }
         
         if active_log:
-            start_time = get_datetime(active_log[0]["from_time"])
+            start_time = get_datetime(active_log.from_time)
             elapsed_seconds = (get_datetime(now_datetime()) - start_time).total_seconds()
             
             result.update({
@@ -356,28 +273,17 @@ def get_current_elapsed_time(task_name):
     """Get current elapsed time for task"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return "0 دقیقه"
         
-        active_log = frappe.db.get_all("Timesheet Detail",
-            filters={
-                "task": task_name,
-                "to_time": ["is", "null"],
-                "parent": ["in", frappe.db.get_list("Timesheet", 
-                    filters={"employee": employee}, 
-                    pluck="name"
-                )]
-            },
-            fields=["from_time"],
-            limit=1
-        )
+        active_log = timer_registry.get_active_timer(employee, task_name)
         
         if not active_log:
             return "0 دقیقه"
         
-        start_time = get_datetime(active_log[0]["from_time"])
+        start_time = get_datetime(active_log.from_time)
         elapsed_seconds = (get_datetime(now_datetime()) - start_time).total_seconds()
         
         return format_duration(elapsed_seconds)
@@ -390,44 +296,28 @@ def get_active_task_for_navbar():
     """Get active task for navbar display"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return None
         
-        active_logs = frappe.db.sql("""
-            SELECT 
-                td.task,
-                td.from_time,
-                t.subject,
-                t.name,
-                t.status,
-                t.progress
-            FROM `tabTimesheet Detail` td
-            JOIN `tabTask` t ON td.task = t.name
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            WHERE td.to_time IS NULL 
-            AND ts.employee = %s
-            AND ts.docstatus = 0
-            ORDER BY td.from_time DESC
-            LIMIT 1
-        """, (employee,), as_dict=True)
-        
-        if not active_logs:
+        active_log = timer_registry.get_active_timer(employee)
+        
+        if not active_log:
             return None
         
-        active_log = active_logs[0]
-        start_time = get_datetime(active_log["from_time"])
+        task = frappe.get_cached_value("Task", active_log.task, ["subject", "status", "progress"], as_dict=True)
+        start_time = get_datetime(active_log.from_time)
         elapsed_seconds = (get_datetime(now_datetime()) - start_time).total_seconds()
         
         return {
-            "task_name": active_log["task"],
-            "task_subject": active_log["subject"],
+            "task_name": active_log.task,
+            "task_subject": task.subject,
             "start_time": start_time.strftime("%H:%M:%S"),
             "elapsed_time": format_duration(elapsed_seconds),
             "elapsed_minutes": int(elapsed_seconds // 60),
-            "status": active_log["status"],
-            "progress": active_log["progress"]
+            "status": task.status,
+            "progress": task.progress
         }
         
     except Exception as e:
@@ -437,38 +327,7 @@ def get_active_task_for_navbar():
 @frappe.whitelist()
 def get_active_tasks_for_notification():
     """دریافت تسک‌های فعال برای اعلان"""
-    try:
-        user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
-        
-        if not employee:
-            return []
-            
-        active_tasks = frappe.db.sql("""
-            SELECT 
-                t.name,
-                t.subject,
-                t.status,
-                td.from_time
-            FROM `tabTask` t
-            JOIN `tabTimesheet Detail` td ON t.name = td.task
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            WHERE td.to_time IS NULL 
-            AND ts.employee = %s
-            AND t.docstatus = 0
-            AND t.status != 'Completed'
-            ORDER BY td.from_time DESC
-        """, (employee,), as_dict=1)
-        
-        return [{
-            "title": task.subject,
-            "message": f"در حال کار روی این تسک از ساعت {frappe.utils.format_datetime(task.from_time, 'HH:mm')}",
-            "route": f"/app/task/{task.name}"
-        } for task in active_tasks]
-        
-    except Exception as e:
-        frappe.log_error(f"Error in get_active_tasks_for_notification: {str(e)}")
-        return []
+    return notifications.get_active_tasks_for_notification()
 
 def validate_task(doc, method=None):
     """Validate task before save"""
@@ -487,14 +346,7 @@ def validate_task(doc, method=None):
     # اگر تسک تکمیل شده است
     if doc.status == "Completed":
         # بررسی تایمرهای باز
-        active_timers = frappe.db.sql("""
-            SELECT ts.name as timesheet, td.name as time_log
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-        """, doc.name, as_dict=1)
+        active_timers = timer_registry.get_task_timers(doc.name)
         
         if active_timers:
             frappe.throw("قبل از تکمیل تسک، لطفا تایمرهای فعال را متوقف کنید")
@@ -510,38 +362,13 @@ def on_task_update(doc, method=None):
     """Handle task updates"""
     if doc.status == "Completed":
         # متوقف کردن همه تایمرهای فعال
-        active_timers = frappe.db.sql("""
-            SELECT ts.name as timesheet, td.name as time_log, td.from_time
-            FROM `tabTimesheet` ts
-            JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-            WHERE td.task = %s
-            AND td.to_time IS NULL
-            AND ts.docstatus = 0
-        """, doc.name, as_dict=1)
-        
-        for timer in active_timers:
-            to_time = now()
-            hours = time_diff_in_hours(to_time, timer.from_time)
-            frappe.db.set_value("Timesheet Detail", timer.time_log, {
-                "to_time": to_time,
-                "hours": hours,
-                "billing_hours": hours
-            })
-        
-        if active_timers:
+        if timer_registry.get_task_timers(doc.name) and timers.close_open_timers(task=doc.name):
             frappe.db.commit()
 
 def on_task_trash(doc, method=None):
     """Handle task deletion"""
     # بررسی وجود تایمرهای فعال
-    active_timers = frappe.db.sql("""
-        SELECT ts.name as timesheet, td.name as time_log
-        FROM `tabTimesheet` ts
-        JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-        WHERE td.task = %s
-        AND td.to_time IS NULL
-        AND ts.docstatus = 0
-    """, doc.name, as_dict=1)
+    active_timers = timer_registry.get_task_timers(doc.name)
     
     if active_timers:
         frappe.throw("قبل از حذف تسک، لطفا تایمرهای فعال را متوقف کنید")
@@ -551,32 +378,29 @@ def get_today_tasks():
     """Get all tasks that user has worked on today"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return []
             
         today = getdate()
-        tasks = frappe.db.sql("""
-            SELECT DISTINCT
-                t.name,
-                t.subject,
-                t.status,
-                t.progress,
-                t.project,
-                p.project_name,
-                MAX(td.from_time) as last_activity,
-                SUM(td.hours) as total_hours
-            FROM `tabTask` t
-            JOIN `tabTimesheet Detail` td ON t.name = td.task
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            LEFT JOIN `tabProject` p ON t.project = p.name
-            WHERE ts.employee = %s
-            AND DATE(td.from_time) = %s
-            AND ts.docstatus = 1
-            GROUP BY t.name
-            ORDER BY last_activity DESC
-        """, (employee, today), as_dict=1)
+        tasks = {}
+        for row in queries.get_rollup_rows(employee, today, today):
+            if not row.subject or not row.submitted_log_count:
+                continue
+            task = tasks.setdefault(row.task, frappe._dict({
+                "name": row.task,
+                "subject": row.subject,
+                "status": row.status,
+                "progress": row.progress,
+                "project": row.project,
+                "project_name": row.project_name,
+                "last_activity": row.last_from_time,
+                "total_hours": 0
+            }))
+            task.total_hours += flt(row.submitted_hours)
+            task.last_activity = max(task.last_activity, row.last_from_time)
+        tasks = sorted(tasks.values(), key=lambda t: t.last_activity, reverse=True)
         
         return [{
             "name": task.name,
@@ -598,7 +422,7 @@ def get_work_statistics():
     """Get work statistics for the last 7 days"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return None
@@ -607,50 +431,29 @@ def get_work_statistics():
         week_ago = today - timedelta(days=6)
         
         # Get daily work hours
-        daily_stats = frappe.db.sql("""
-            SELECT 
-                DATE(td.from_time) as date,
-                SUM(td.hours) as total_hours,
-                COUNT(DISTINCT td.task) as task_count
-            FROM `tabTimesheet Detail` td
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND DATE(td.from_time) BETWEEN %s AND %s
-            AND ts.docstatus = 1
-            GROUP BY DATE(td.from_time)
-            ORDER BY date
-        """, (employee, week_ago, today), as_dict=1)
-        
-        # Get today's total hours
-        today_hours = frappe.db.sql("""
-            SELECT SUM(td.hours) as total_hours
-            FROM `tabTimesheet Detail` td
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND DATE(td.from_time) = %s
-            AND ts.docstatus = 1
-        """, (employee, today))[0][0] or 0
-        
-        # Get week's total hours
-        week_hours = frappe.db.sql("""
-            SELECT SUM(td.hours) as total_hours
-            FROM `tabTimesheet Detail` td
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            WHERE ts.employee = %s
-            AND DATE(td.from_time) BETWEEN %s AND %s
-            AND ts.docstatus = 1
-        """, (employee, week_ago, today))[0][0] or 0
+        daily_stats = {}
+        for row in queries.get_rollup_rows(employee, week_ago, today):
+            if not row.submitted_log_count:
+                continue
+            stat = daily_stats.setdefault(row.work_date, frappe._dict({"total_hours": 0, "tasks": set()}))
+            stat.total_hours += flt(row.submitted_hours)
+            if row.task:
+                stat.tasks.add(row.task)
+        
+        # Today's and the week's totals come from the same daily rows
+        today_hours = daily_stats[today].total_hours if today in daily_stats else 0
+        week_hours = sum(stat.total_hours for stat in daily_stats.values())
         
         # Format daily stats
         formatted_stats = []
         for i in range(7):
             date = today - timedelta(days=i)
-            day_stat = next((stat for stat in daily_stats if stat.date == date), None)
+            day_stat = daily_stats.get(date)
             formatted_stats.append({
                 "date": date.strftime("%Y-%m-%d"),
                 "day": date.strftime("%a"),
                 "hours": round(day_stat.total_hours, 2) if day_stat else 0,
-                "task_count": day_stat.task_count if day_stat else 0
+                "task_count": len(day_stat.tasks) if day_stat else 0
             })
         
         return {
@@ -668,32 +471,12 @@ def get_overdue_tasks():
     """Get tasks that have passed their expected start date"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return []
             
-        today = getdate()
-        overdue_tasks = frappe.db.sql("""
-            SELECT 
-                t.name,
-                t.subject,
-                t.status,
-                t.progress,
-                t.project,
-                p.project_name,
-                t.exp_start_date,
-                DATEDIFF(%s, t.exp_start_date) as days_overdue
-            FROM `tabTask` t
-            LEFT JOIN `tabProject` p ON t.project = p.name
-            WHERE t.exp_start_date < %s
-            AND t.status != 'Completed'
-            AND (
-                t.assigned_to = %s
-                OR t._user_tags LIKE %s
-            )
-            ORDER BY t.exp_start_date ASC
-        """, (today, today, user, f'%{user}%'), as_dict=1)
+        overdue_tasks = queries.get_overdue_tasks_by_start_date(user, getdate())
         
         return [{
             "name": task.name,
@@ -715,49 +498,14 @@ def get_available_tasks():
     """Get tasks that can be started"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return []
             
         # Get tasks that are not completed and not already being worked on
-        tasks = frappe.db.sql("""
-            SELECT 
-                t.name,
-                t.subject,
-                t.status,
-                t.progress,
-                t.project,
-                p.project_name,
-                t.priority,
-                t.exp_start_date,
-                t.exp_end_date
-            FROM `tabTask` t
-            LEFT JOIN `tabProject` p ON t.project = p.name
-            WHERE t.status != 'Completed'
-            AND (
-                t.assigned_to = %s
-                OR t._user_tags LIKE %s
-            )
-            AND NOT EXISTS (
-                SELECT 1 
-                FROM `tabTimesheet Detail` td
-                JOIN `tabTimesheet` ts ON td.parent = ts.name
-                WHERE td.task = t.name
-                AND td.to_time IS NULL
-                AND ts.employee = %s
-                AND ts.docstatus = 0
-            )
-            ORDER BY 
-                CASE t.priority
-                    WHEN 'High' THEN 1
-                    WHEN 'Medium' THEN 2
-                    WHEN 'Low' THEN 3
-                    ELSE 4
-                END,
-                t.exp_start_date ASC,
-                t.creation DESC
-        """, (user, f'%{user}%', employee), as_dict=1)
+        running = {timer.task for timer in timer_registry.get_employee_timers(employee)}
+        tasks = [task for task in queries.get_startable_tasks(user) if task.name not in running]
         
         return [{
             "name": task.name,
@@ -776,178 +524,212 @@ def get_available_tasks():
         return []
 
 @frappe.whitelist()
-def get_current_employees_status():
-	"""Get current active tasks for all employees"""
-	active_statuses = frappe.db.sql("""
-		SELECT
-			task.name as task_name,
-			task.subject as task_subject,
-			emp.employee_name as employee_name,
-			user.user_image as user_image,
-			td.from_time as start_time
-		FROM `tabTimesheet` ts
-		JOIN `tabTimesheet Detail` td ON td.parent = ts.name
-		JOIN `tabTask` task ON task.name = td.task
-		JOIN `tabEmployee` emp ON emp.name = ts.employee
-		JOIN `tabUser` user ON user.name = emp.user_id
-		WHERE ts.docstatus = 0
-		AND td.to_time IS NULL
-	""", as_dict=1)
-
-	return active_statuses
+def get_current_employees_status(page=1, page_length=team_board.PAGE_LENGTH, department=None, project=None, version=None):
+	"""Get one page of the current active tasks of all employees
+
+	Pass the ``version`` of the last response to get ``{"not_modified": True}``
+	instead of the rows when nothing has changed.
+	"""
+	return team_board.get_page(page, page_length, department, project, version)
 
 @frappe.whitelist()
-def get_my_overdue_tasks():
-	"""Get overdue tasks for the current user"""
+def get_my_overdue_tasks(version=None):
+	"""Get overdue tasks for the current user
+
+	Like every navbar endpoint it returns the bare list unless ``version`` is
+	passed (empty on the first call); then it returns ``{"version", "data"}``,
+	or ``{"version", "not_modified"}`` when ``version`` is still current.
+	"""
 	user = frappe.session.user
-	today = getdate()
-
-	overdue_tasks = frappe.db.sql("""
-		SELECT
-			name,
-			subject,
-			project,
-			exp_end_date,
-			progress,
-			DATEDIFF(%s, exp_end_date) as days_overdue
-		FROM `tabTask`
-		WHERE assigned_to LIKE %s
-		AND exp_end_date < %s
-		AND status NOT IN ('Completed', 'Cancelled')
-		ORDER BY exp_end_date ASC
-	""", (today, f'%{user}%', today), as_dict=1)
-
-	return overdue_tasks
+	return navbar_versions.respond(
+		version,
+		[navbar_versions.user_scope(user)],
+		lambda: _get_overdue_tasks(user)
+	)
 
 @frappe.whitelist()
-def get_my_today_tasks():
+def get_my_today_tasks(version=None):
 	"""Get tasks worked on by the current user today"""
-	user = frappe.session.user
-	today_start = get_datetime(today()).replace(hour=0, minute=0, second=0, microsecond=0)
-	today_end = get_datetime(today()).replace(hour=23, minute=59, second=59, microsecond=999999)
-
-	today_tasks = frappe.db.sql("""
-		SELECT
-			task.name,
-			task.subject,
-			task.project,
-			task.progress,
-			SUM(td.hours) as total_hours_today,
-			MAX(td.to_time) as last_activity_time,
-            (SELECT COUNT(*) FROM `tabTimesheet Detail` WHERE task = task.name AND to_time IS NULL AND parent = ts.name) > 0 as is_active
-		FROM `tabTimesheet Detail` td
-		JOIN `tabTimesheet` ts ON ts.name = td.parent
-		JOIN `tabTask` task ON task.name = td.task
-		JOIN `tabEmployee` emp ON emp.name = ts.employee
-		WHERE emp.user_id = %s
-		AND td.from_time BETWEEN %s AND %s
-		GROUP BY task.name, task.subject, task.project, task.progress
-		ORDER BY last_activity_time DESC
-	""", (user, today_start, today_end), as_dict=1)
-
-	# Format total hours and last activity time
-	for task in today_tasks:
-		task['total_time'] = frappe.utils.format_duration(task['total_hours_today'] * 3600)
-		task['last_activity'] = frappe.utils.get_datetime_str(task['last_activity_time']).split(' ')[1] if task['last_activity_time'] else '--:--'
-
-	return today_tasks
+	employee = employee_context.get_employee()
+
+	def build():
+		if not employee:
+			return []
+		day = getdate()
+		return _build_today_tasks(queries.get_rollup_rows(employee, day, day), timer_registry.get_employee_timers(employee), day)
+
+	return navbar_versions.respond(version, _employee_scopes(employee), build)
 
 @frappe.whitelist()
-def get_my_today_time_data():
+def get_my_today_time_data(version=None):
 	"""Get time data for tasks worked on by the current user today for charting"""
-	try:
-		user = frappe.session.user
-		employee = frappe.db.get_value("Employee", {"user_id": user})
+	employee = employee_context.get_employee()
 
-		if not employee:
+	def build():
+		try:
+			if not employee:
+				return []
+
+			day = getdate()
+			return _build_today_time_data(queries.get_rollup_rows(employee, day, day), day)
+
+		except Exception as e:
+			frappe.log_error(f"Error in get_my_today_time_data: {str(e)}")
 			return []
 
-		today_start = get_datetime(today()).replace(hour=0, minute=0, second=0, microsecond=0)
-		today_end = get_datetime(today()).replace(hour=23, minute=59, second=59, microsecond=999999)
-
-		time_data = frappe.db.sql("""
-			SELECT
-				task.name as task_name,
-				task.subject as task_subject,
-				task.project,
-				p.project_name,
-				p.color as project_color,
-				SUM(td.hours) as total_hours
-			FROM `tabTimesheet Detail` td
-			JOIN `tabTimesheet` ts ON ts.name = td.parent
-			JOIN `tabTask` task ON task.name = td.task
-			LEFT JOIN `tabProject` p ON task.project = p.name
-			JOIN `tabEmployee` emp ON emp.name = ts.employee
-			WHERE emp.user_id = %s
-			AND td.from_time BETWEEN %s AND %s
-			GROUP BY task.name, task.subject, task.project, p.project_name, p.color
-			ORDER BY total_hours DESC
-		""", (user, today_start, today_end), as_dict=1)
-
-		# Convert hours to float for chart and add formatted time
-		for item in time_data:
-			item['hours'] = float(item['total_hours'])
-			item['total_time_formatted'] = format_duration(item['total_hours'] * 3600)
-			if not item.get('project_color'):
-				item['project_color'] = '#6c757d'
-
-		return time_data
-
-	except Exception as e:
-		frappe.log_error(f"Error in get_my_today_time_data: {str(e)}")
-		return []
+	return navbar_versions.respond(version, _employee_scopes(employee), build)
 
 @frappe.whitelist()
-def get_my_daily_project_time_data():
+def get_my_daily_project_time_data(version=None):
     """Get daily time data per project for the last 7 days for the current user"""
-    try:
-        user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+    employee = employee_context.get_employee()
 
-        if not employee:
-            frappe.log_error("Employee not found for user: " + user, "get_my_daily_project_time_data")
+    def build():
+        try:
+            if not employee:
+                return []
+
+            today = getdate()
+            week_ago = today - timedelta(days=6)
+            return _build_daily_project_time_data(queries.get_rollup_rows(employee, week_ago, today))
+
+        except Exception as e:
+            frappe.log_error(f"Error in get_my_daily_project_time_data: {str(e)}", "get_my_daily_project_time_data")
             return []
 
+    return navbar_versions.respond(version, _employee_scopes(employee), build)
+
+@frappe.whitelist()
+def get_navbar_state(version=None):
+    """Get everything the navbar dropdown shows in a single response"""
+    user = frappe.session.user
+    employee = employee_context.get_employee(user)
+    team_status = team_board.get_page()
+
+    def build():
         today = getdate()
         week_ago = today - timedelta(days=6)
-        
-        # Log only the date range, not the full data
-        frappe.log_error(f"Fetching daily project time data for employee: {employee}, date range: {week_ago} to {today}", "get_my_daily_project_time_data")
-
-        time_data = frappe.db.sql("""
-            SELECT
-                DATE(td.from_time) as work_date,
-                t.project,
-                p.project_name,
-                p.color,
-                SUM(td.hours) as total_hours
-            FROM `tabTimesheet Detail` td
-            JOIN `tabTimesheet` ts ON ts.name = td.parent
-            JOIN `tabTask` t ON t.name = td.task
-            LEFT JOIN `tabProject` p ON t.project = p.name
-            JOIN `tabEmployee` emp ON emp.name = ts.employee
-            WHERE emp.user_id = %s
-            AND DATE(td.from_time) BETWEEN %s AND %s
-            AND ts.docstatus = 1
-            GROUP BY 1, t.project, p.project_name, p.color
-            ORDER BY work_date ASC, t.project ASC
-        """, (user, week_ago, today), as_dict=1)
-        
-        # Log only the count of records found
-        frappe.log_error(f"Found {len(time_data)} time records for employee {employee}", "get_my_daily_project_time_data")
-
-        # Convert hours to float and add default color if missing
-        for item in time_data:
-            item['total_hours'] = float(item['total_hours'])
-            if not item.get('color'):
-                # Assign a random color (or a predefined fallback) if project has no color
-                item['color'] = '#' + '%06x' % random.randint(0, 0xFFFFFF)
-
-        return time_data
+        # One read of the last 7 days of rollup rows feeds today's tasks and both charts
+        rows = queries.get_rollup_rows(employee, week_ago, today) if employee else []
+        open_timers = timer_registry.get_employee_timers(employee) if employee else []
 
-    except Exception as e:
-        frappe.log_error(f"Error in get_my_daily_project_time_data: {str(e)}", "get_my_daily_project_time_data")
-        return []
+        return {
+            "current_status": team_status["rows"],
+            "current_status_total": team_status["total"],
+            "current_status_version": team_status["version"],
+            "overdue_tasks": _get_overdue_tasks(user),
+            "today_tasks": _build_today_tasks(rows, open_timers, today),
+            "today_time_data": _build_today_time_data(rows, today),
+            "daily_project_time_data": _build_daily_project_time_data(rows),
+            "active_timer": timer_registry.get_active_timer_summary(employee)
+        }
+
+    # The team board has its own version, so it becomes one more part of the token.
+    # This endpoint was versioned from the start, so it always answers with a version
+    return navbar_versions.respond(
+        version or "",
+        [navbar_versions.user_scope(user), navbar_versions.employee_scope(employee)],
+        build,
+        parts=[team_status["version"]]
+    )
+
+def _employee_scopes(employee):
+    # The session user's scope covers changes to the tasks the employee timed
+    return [navbar_versions.user_scope(frappe.session.user), navbar_versions.employee_scope(employee)]
+
+def _get_overdue_tasks(user):
+    return queries.get_overdue_tasks_by_end_date(user, getdate())
+
+def _build_today_tasks(rows, open_timers, day):
+    """Today's tasks from rollup rows, plus tasks whose timer is still running"""
+    tasks = {}
+
+    def get_task(name, subject, project, progress):
+        return tasks.setdefault(name, frappe._dict({
+            "name": name,
+            "subject": subject,
+            "project": project,
+            "progress": progress,
+            "total_hours_today": 0,
+            "last_activity_time": None,
+            "is_active": 0
+        }))
+
+    for row in rows:
+        if row.work_date != day or not row.log_count or not row.subject:
+            continue
+        task = get_task(row.task, row.subject, row.project, row.progress)
+        task.total_hours_today += flt(row.hours)
+        if row.last_to_time and (not task.last_activity_time or row.last_to_time > task.last_activity_time):
+            task.last_activity_time = row.last_to_time
+
+    for timer in open_timers:
+        if not timer.task or getdate(timer.from_time) != day:
+            continue
+        details = frappe.get_cached_value("Task", timer.task, ["subject", "progress"], as_dict=True)
+        if not details:
+            continue
+        get_task(timer.task, details.subject, timer.project, details.progress).is_active = 1
+
+    today_tasks = sorted(tasks.values(), key=lambda t: t.last_activity_time or datetime.min, reverse=True)
+
+    # Format total hours and last activity time
+    for task in today_tasks:
+        task['total_time'] = format_duration(task['total_hours_today'] * 3600)
+        task['last_activity'] = frappe.utils.get_datetime_str(task['last_activity_time']).split(' ')[1] if task['last_activity_time'] else '--:--'
+
+    return today_tasks
+
+def _build_today_time_data(rows, day):
+    tasks = {}
+    for row in rows:
+        if row.work_date != day or not row.log_count or not row.subject:
+            continue
+        item = tasks.setdefault(row.task, frappe._dict({
+            "task_name": row.task,
+            "task_subject": row.subject,
+            "project": row.project,
+            "project_name": row.project_name,
+            "project_color": row.color,
+            "total_hours": 0
+        }))
+        item.total_hours += flt(row.hours)
+
+    time_data = sorted(tasks.values(), key=lambda item: item.total_hours, reverse=True)
+
+    # Convert hours to float for chart and add formatted time
+    for item in time_data:
+        item['hours'] = float(item['total_hours'])
+        item['total_time_formatted'] = format_duration(item['total_hours'] * 3600)
+        if not item.get('project_color'):
+            item['project_color'] = '#6c757d'
+
+    return time_data
+
+def _build_daily_project_time_data(rows):
+    days = {}
+    for row in rows:
+        # Only submitted timesheets count towards the weekly summary
+        if not row.submitted_log_count or not row.subject:
+            continue
+        item = days.setdefault((row.work_date, row.project), frappe._dict({
+            "work_date": row.work_date,
+            "project": row.project,
+            "project_name": row.project_name,
+            "color": row.color,
+            "total_hours": 0
+        }))
+        item.total_hours += flt(row.submitted_hours)
+
+    time_data = sorted(days.values(), key=lambda item: (item.work_date, item.project or ""))
+
+    # Add default color if missing
+    for item in time_data:
+        if not item.get('color'):
+            # Assign a random color (or a predefined fallback) if project has no color
+            item['color'] = '#' + '%06x' % random.randint(0, 0xFFFFFF)
+
+    return time_data
 
 @frappe.whitelist()
 def test_task_methods(task_name):
@@ -0,0 +1,79 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+"""Employee context of a user.
+
+The fields every timer call needs (employee, display name, default activity
+type and company) are read with one query, kept in the Redis cache per user
+and memoized for the rest of the request in ``frappe.local.cache``. Employee
+doc events drop the cached entry once their transaction commits.
+"""
+
+import frappe
+
+CACHE_KEY = "better_project:employee_context:{0}"
+CACHE_TTL = 6 * 60 * 60
+
+
+def get_employee_context(user=None):
+    """Employee context of a user (default: session user), or None if the user has no employee"""
+    user = user or frappe.session.user
+    local_key = CACHE_KEY.format(user)
+    if local_key in frappe.local.cache:
+        return frappe.local.cache[local_key]
+
+    context = frappe.cache().get_value(local_key)
+    if context is None:
+        context = _load(user)
+        # An empty dict marks "no employee" so it is cached as well
+        frappe.cache().set_value(local_key, context, expires_in_sec=CACHE_TTL)
+
+    context = frappe._dict(context) if context else None
+    frappe.local.cache[local_key] = context
+    return context
+
+
+def get_employee(user=None):
+    """Employee linked to a user (default: session user)"""
+    context = get_employee_context(user)
+    return context.employee if context else None
+
+
+def invalidate(*users):
+    """Drop the cached context of the given users once the transaction commits"""
+    keys = [CACHE_KEY.format(user) for user in set(users) if user]
+    if not keys:
+        return
+
+    for key in keys:
+        frappe.local.cache.pop(key, None)
+
+    def _drop():
+        for key in keys:
+            frappe.cache().delete_value(key)
+
+    frappe.db.after_commit.add(_drop)
+
+
+def on_employee_change(doc, method=None):
+    """Employee doc event: drop the context of its current and previous user"""
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    invalidate(doc.user_id, before.user_id if before else None)
+
+
+def _load(user):
+    row = frappe.db.get_value(
+        "Employee",
+        {"user_id": user},
+        ["name", "employee_name", "default_activity_type", "company"],
+        as_dict=True
+    )
+    if not row:
+        return {}
+
+    return {
+        "employee": row.name,
+        "employee_name": row.employee_name,
+        "default_activity_type": row.default_activity_type,
+        "company": row.company or frappe.defaults.get_defaults().company
+    }
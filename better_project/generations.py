@@ -0,0 +1,57 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+"""Generation counters for values cached from the database.
+
+A value filled from the database is stored with the generation its key had
+before the query ran, and a change increments the generation once its
+transaction commits. A fill that read the data before that commit carries the
+old generation and is ignored by the next read, however the fill and the
+invalidation interleave. Counters start at a random value, so one lost with
+the cache does not repeat old generations.
+"""
+
+import random
+
+import frappe
+
+KEY = "better_project:generation:{0}"
+# An unused counter expires; values stamped with it are then simply refilled
+TTL = 24 * 3600
+
+
+def get(*names):
+    """Current generation of each name, in order"""
+    cache = frappe.cache()
+    keys = [cache.make_key(KEY.format(name)) for name in names]
+    if not keys:
+        return []
+
+    pipeline = cache.pipeline()
+    for key in keys:
+        pipeline.set(key, _start(), ex=TTL, nx=True)
+    pipeline.mget(keys)
+    return [int(value) for value in pipeline.execute()[-1]]
+
+
+def bump(*names):
+    """Increment the generation of each name once the current transaction commits"""
+    names = [name for name in names if name]
+    if not names:
+        return
+
+    def _bump():
+        cache = frappe.cache()
+        pipeline = cache.pipeline()
+        for name in names:
+            key = cache.make_key(KEY.format(name))
+            pipeline.set(key, _start(), ex=TTL, nx=True)
+            pipeline.incr(key)
+            pipeline.expire(key, TTL)
+        pipeline.execute()
+
+    frappe.db.after_commit.add(_bump)
+
+
+def _start():
+    return random.randint(1, 2 ** 31)
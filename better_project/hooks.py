@@ -29,22 +29,22 @@ app_include_css = [
     "/assets/better_project/css/better_project.css"
 ]
 
+# One desk bundle with the navbar timer; Chart.js (chart.bundle.js) is loaded on
+# first use and the Task form timer comes with the Task form (see doctype_js)
 app_include_js = [
-    "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js",
-    "/assets/better_project/js/task_timer_client.js",
-    "/assets/better_project/js/navbar_timer.js"
+    "better_project.bundle.js"
 ]
 
+# The running timer comes with the desk boot, so the navbar shows it without a request
+extend_bootinfo = "better_project.timer_registry.extend_bootinfo"
+
 # include js, css files in header of web template
 web_include_css = [
     "/assets/better_project/css/better_project.css"
 ]
 
-web_include_js = [
-    "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js",
-    "/assets/better_project/js/task_timer_client.js",
-    "/assets/better_project/js/navbar_timer.js"
-]
+# The timer UI is desk-only, so nothing is included in portal pages
+# web_include_js = "/assets/better_project/js/better_project.js"
 
 # include custom scss in every website theme (without file extension ".scss")
 # website_theme_scss = "better_project/public/scss/website"
@@ -54,23 +54,14 @@ web_include_js = [
 # webform_include_css = {"doctype": "public/css/doctype.css"}
 
 # include js in page
-page_js = {
-    "navbar_timer": "better_project/public/js/navbar_timer.js"
-}
+# page_js = {"page" : "public/js/file.js"}
 
 # include js in doctype views
 doctype_js = {
-    "Task": "better_project/doctype/task/task.js"
-}
-
-# include js in workspace
-workspace_js = {
-    "navbar_timer": "better_project/public/js/navbar_timer.js"
-}
-
-# include js in desk
-desk_js = {
-    "navbar_timer": "better_project/public/js/navbar_timer.js"
+    "Task": [
+        "better_project/doctype/task/task.js",
+        "public/js/task_timer_client.js"
+    ]
 }
 
 # doctype_list_js = {"doctype" : "public/js/doctype_list.js"}
@@ -112,7 +103,7 @@ desk_js = {
 # ------------
 
 # before_install = "better_project.install.before_install"
-# after_install = "better_project.install.after_install"
+after_install = "better_project.install.after_install"
 
 # Uninstallation
 # ------------
@@ -163,33 +154,62 @@ notification_config = "better_project.notifications.get_notification_config"
 # Hook on document methods and events
 
 doc_events = {
+    "Employee": {
+        "on_update": "better_project.employee_context.on_employee_change",
+        "on_trash": "better_project.employee_context.on_employee_change"
+    },
     "Task": {
-        "on_update": "better_project.doctype.task.task.on_task_update",
+        "on_update": [
+            "better_project.doctype.task.task.on_task_update",
+            "better_project.navbar_versions.on_task_change"
+        ],
         "on_trash": "better_project.doctype.task.task.on_task_trash",
+        "after_delete": [
+            # Before the index rows of the task are dropped
+            "better_project.navbar_versions.on_task_change",
+            "better_project.task_assignees.on_task_delete"
+        ],
         "validate": "better_project.doctype.task.task.validate_task"
+    },
+    "Project": {
+        "on_update": "better_project.navbar_versions.on_task_change"
+    },
+    "ToDo": {
+        "on_update": "better_project.task_assignees.on_todo_change",
+        "after_delete": "better_project.task_assignees.on_todo_change"
+    },
+    "Timesheet": {
+        "on_update": [
+            "better_project.timer_registry.on_timesheet_change",
+            "better_project.time_rollup.on_timesheet_change"
+        ],
+        "on_submit": [
+            "better_project.timer_registry.on_timesheet_change",
+            "better_project.time_rollup.on_timesheet_change"
+        ],
+        "on_cancel": [
+            "better_project.timer_registry.on_timesheet_change",
+            "better_project.time_rollup.on_timesheet_change"
+        ],
+        "on_trash": "better_project.timer_registry.on_timesheet_change",
+        "after_delete": "better_project.time_rollup.on_timesheet_change"
     }
 }
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"better_project.tasks.all"
-# 	],
-# 	"daily": [
-# 		"better_project.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"better_project.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"better_project.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"better_project.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+    "all": [
+        "better_project.recompute.process_pending"
+    ],
+    "hourly": [
+        "better_project.timers.auto_close_stale_timers"
+    ],
+    "daily": [
+        "better_project.time_totals.reconcile_daily"
+    ]
+}
 
 # Testing
 # -------
@@ -220,13 +240,21 @@ override_whitelisted_methods = {
 
 # Request Events
 # ----------------
-# before_request = ["better_project.utils.before_request"]
-# after_request = ["better_project.utils.after_request"]
+# Query counts and timings of the app's endpoints (Server-Timing header) and
+# the opt-in slow query log (better_project_slow_query_ms in site_config)
+before_request = [
+    "better_project.request_timing.before_request",
+    "better_project.slow_queries.install"
+]
+after_request = [
+    "better_project.request_timing.after_request",
+    "better_project.slow_queries.uninstall"
+]
 
 # Job Events
 # ----------
-# before_job = ["better_project.utils.before_job"]
-# after_job = ["better_project.utils.after_job"]
+before_job = ["better_project.slow_queries.install"]
+after_job = ["better_project.slow_queries.uninstall"]
 
 # User Data Protection
 # --------------------
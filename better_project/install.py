@@ -0,0 +1,9 @@
+from better_project import task_assignees, time_rollup
+from better_project.migrations.versions import add_timer_query_indexes
+
+
+def after_install():
+    """Create the app's own tables and indexes; patches are not run on a fresh install"""
+    time_rollup.ensure_table()
+    task_assignees.ensure_table()
+    add_timer_query_indexes.execute()
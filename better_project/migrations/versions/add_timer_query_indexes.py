@@ -0,0 +1,19 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+import frappe
+
+# (doctype, columns, index name) for the filters the timer and dashboard queries use
+INDEXES = [
+    ("Timesheet Detail", ["to_time", "parent"], "to_time_parent_index"),
+    ("Timesheet Detail", ["task", "to_time"], "task_to_time_index"),
+    ("Timesheet Detail", ["parent", "from_time"], "parent_from_time_index"),
+    ("Timesheet", ["employee", "docstatus", "start_date", "end_date"], "employee_docstatus_dates_index"),
+    ("Task", ["exp_end_date", "status"], "exp_end_date_status_index"),
+]
+
+
+def execute():
+    """Add composite indexes for the active-timer and time-log queries"""
+    for doctype, columns, index_name in INDEXES:
+        frappe.db.add_index(doctype, columns, index_name)
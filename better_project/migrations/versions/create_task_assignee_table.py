@@ -0,0 +1,10 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+from better_project import task_assignees
+
+
+def execute():
+    """Create the task-assignee index and backfill it from ToDos and time logs"""
+    task_assignees.ensure_table()
+    task_assignees.rebuild()
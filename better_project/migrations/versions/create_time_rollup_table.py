@@ -0,0 +1,10 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+from better_project import time_rollup
+
+
+def execute():
+    """Create the daily time rollup table and backfill it from existing time logs"""
+    time_rollup.ensure_table()
+    time_rollup.rebuild()
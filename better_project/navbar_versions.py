@@ -0,0 +1,64 @@
+"""Version tokens for the navbar endpoints.
+
+Each endpoint's data depends on a few scopes: the employee's time logs and
+the user's tasks (their assignments and the tasks and projects themselves).
+Every scope has a generation counter in the Redis cache (see
+``generations``) that is incremented once a transaction changing it commits;
+a Task or Project change bumps only the users the task-assignee index lists
+for it. An endpoint combines the generations of its scopes with today's date
+(overdue and "today" data change at midnight) and, when the client sends back
+the token it already has, answers ``not_modified`` without running its
+queries.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import today
+
+from better_project import generations, queries
+
+KEY = "better_project:navbar_version:{0}"
+
+
+def employee_scope(employee):
+    return f"employee:{employee}"
+
+
+def user_scope(user):
+    return f"user:{user}"
+
+
+def get_token(*scopes, parts=()):
+    """Current version token of the given scopes and any extra parts"""
+    values = generations.get(*[KEY.format(scope) for scope in scopes])
+    return hashlib.md5("|".join([today(), *map(str, values), *parts]).encode()).hexdigest()[:12]
+
+
+def bump(*scopes):
+    """Change the token of the given scopes once the current transaction commits"""
+    generations.bump(*[KEY.format(scope) for scope in scopes if scope])
+
+
+def respond(version, scopes, build, parts=()):
+    """``{"version", "data"}`` from ``build()``, or ``{"version", "not_modified"}`` if the client is current
+
+    A caller opts in by passing ``version`` (empty on its first call); without
+    it the endpoint returns the bare ``build()`` result, as it did before.
+    """
+    if version is None:
+        return build()
+    # Read before build(): a change committed during it gives the next call a new token
+    token = get_token(*scopes, parts=parts)
+    if version and version == token:
+        return {"version": token, "not_modified": True}
+    return {"version": token, "data": build()}
+
+
+def on_task_change(doc, method=None):
+    """Task/Project doc event: subjects, progress and dates shown in the navbar may have changed"""
+    if doc.doctype == "Project":
+        users = queries.get_project_task_users(doc.name)
+    else:
+        users = queries.get_task_users(doc.name)
+    bump(*[user_scope(user) for user in users])
@@ -3,6 +3,8 @@
 import frappe
 from frappe import _
 
+from better_project import employee_context, timer_registry
+
 def get_notification_config():
     """Return notification config for this app"""
     return {
@@ -24,33 +26,26 @@ def get_active_tasks_for_notification():
     """دریافت تسک‌های فعال برای اعلان"""
     try:
         user = frappe.session.user
-        employee = frappe.db.get_value("Employee", {"user_id": user})
+        employee = employee_context.get_employee(user)
         
         if not employee:
             return []
-            
-        active_tasks = frappe.db.sql("""
-            SELECT 
-                t.name,
-                t.subject,
-                t.status,
-                td.from_time
-            FROM `tabTask` t
-            JOIN `tabTimesheet Detail` td ON t.name = td.task
-            JOIN `tabTimesheet` ts ON td.parent = ts.name
-            WHERE td.to_time IS NULL 
-            AND ts.employee = %s
-            AND t.docstatus = 0
-            AND t.status != 'Completed'
-            ORDER BY td.from_time DESC
-        """, (employee,), as_dict=1)
         
-        return [{
-            "title": task.subject,
-            "message": f"در حال کار روی این تسک از ساعت {frappe.utils.format_datetime(task.from_time, 'HH:mm')}",
-            "route": f"/app/task/{task.name}"
-        } for task in active_tasks]
+        notifications = []
+        for timer in timer_registry.get_employee_timers(employee):
+            if not timer.task:
+                continue
+            task = frappe.get_cached_value("Task", timer.task, ["subject", "status", "docstatus"], as_dict=True)
+            if not task or task.docstatus != 0 or task.status == "Completed":
+                continue
+            notifications.append({
+                "title": task.subject,
+                "message": f"در حال کار روی این تسک از ساعت {frappe.utils.format_datetime(timer.from_time, 'HH:mm')}",
+                "route": f"/app/task/{timer.task}"
+            })
+        
+        return notifications
         
     except Exception as e:
         frappe.log_error(f"Error in get_active_tasks_for_notification: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
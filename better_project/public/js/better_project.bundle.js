@@ -0,0 +1,7 @@
+// Desk bundle of better_project, included once through app_include_js.
+// Chart.js lives in its own chunk (chart.bundle.js) and the Task form timer
+// is loaded with the Task form through doctype_js; it uses the shared ticker.
+// tab_leader lets one tab of the user poll and share the navbar data.
+import "./ticker";
+import "./tab_leader";
+import "./navbar_timer";
@@ -0,0 +1,5 @@
+// Chart.js for the navbar time charts, built into this app's assets so no
+// external CDN is needed. Loaded on demand with frappe.require("chart.bundle.js").
+import Chart from "chart.js/auto";
+
+window.Chart = Chart;
@@ -1,7 +1,6 @@
 // Navbar Timer for ERPNext
 // فایل: better_project/public/js/navbar_timer.js
-
-console.log('Navbar Timer JS loaded'); // Debug log
+// Built into better_project.bundle.js (desk only); initializes once per page.
 
 // Helper function to find the correct navbar element
 function findNavbarContainer() {
@@ -18,21 +17,16 @@ function findNavbarContainer() {
     for (const selector of selectors) {
         const element = $(selector);
         if (element.length) {
-            console.log('Found navbar using selector:', selector);
             return element;
         }
     }
     
-    console.log('No navbar found with any selector');
     return null;
 }
 
 function setup_navbar_timer() {
-    console.log('Setting up navbar timer...'); // Debug log
-    
     // Check if user is logged in
     if (!frappe.session.user || frappe.session.user === 'Guest') {
-        console.log('User not logged in, skipping navbar timer setup');
         return;
     }
     
@@ -41,12 +35,9 @@ function setup_navbar_timer() {
     
     // پیدا کردن Navbar مناسب با استفاده از تابع کمکی
     const navbar = findNavbarContainer();
-    console.log('Found navbar:', navbar ? true : false); // Debug log
     
     // اگر navbar پیدا شد
     if (navbar) {
-        console.log('Adding timer to navbar...'); // Debug log
-        
         // استفاده از data-bs-toggle برای Bootstrap 5
         const timer_html = `
             <li class="nav-item dropdown" id="navbar-timer">
@@ -55,6 +46,7 @@ function setup_navbar_timer() {
                     <span class="timer-icon">
                         <i class="fa fa-tasks" style="font-size: 18px;"></i>
                     </span>
+                    <span class="active-timer-badge hidden"></span>
                 </a>
                 <div class="dropdown-menu dropdown-menu-end timer-dropdown">
                     <!-- Today's Time Chart Summary -->
@@ -125,76 +117,387 @@ function setup_navbar_timer() {
         `;
         
         navbar.prepend(timer_html);
-        console.log('Timer HTML added to navbar'); // Debug log
         
         setup_timer_events();
         add_timer_styles();
+        render_active_timer();
         
         // بروزرسانی اولیه محتوا
         refresh_navbar_timer();
-    } else {
-        console.log('Navbar not found'); // Debug log
     }
 }
 
-// راه‌اندازی اولیه با تاخیر مناسب
+// راه‌اندازی اولیه بدون تاخیر؛ فقط یک بار در هر صفحه
 $(document).ready(function() {
-    console.log('Document ready, waiting for navbar...'); // Debug log
-    
-    // چک کردن وجود Chart.js
-    if (typeof Chart === 'undefined') {
-        console.error('Chart.js is not loaded!');
-        // لود کردن Chart.js از CDN
-        const script = document.createElement('script');
-        script.src = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js';
-        script.onload = function() {
-            console.log('Chart.js loaded successfully');
-            initializeTimer();
-        };
-        document.head.appendChild(script);
-    } else {
-        initializeTimer();
+    if (window.better_project_navbar_initialized) {
+        return;
     }
+    window.better_project_navbar_initialized = true;
+    initializeTimer();
 });
 
 function initializeTimer() {
-    // تاخیر 1 ثانیه‌ای برای اطمینان از لود شدن کامل صفحه
-    setTimeout(function() {
-        console.log('Initial setup timeout reached'); // Debug log
-        
-        // تلاش برای راه‌اندازی timer در navbar
-        setup_navbar_timer();
-        
-        // اگر navbar هنوز لود نشده، منتظر بمان و دوباره تلاش کن
-        if (!$('#navbar-timer').length) {
-            console.log('Timer not found, starting interval check...'); // Debug log
-            
-            const checkNavbar = setInterval(function() {
-                console.log('Checking for navbar...'); // Debug log
-                
-                if (findNavbarContainer()) {
-                    console.log('Navbar found in interval check'); // Debug log
-                    setup_navbar_timer();
-                    if ($('#navbar-timer').length) {
-                        console.log('Timer successfully added'); // Debug log
-                        clearInterval(checkNavbar);
-                    }
-                }
-            }, 500);
-            
-            // توقف چک کردن بعد از 10 ثانیه
-            setTimeout(function() {
-                console.log('Stopping navbar check interval'); // Debug log
-                clearInterval(checkNavbar);
-            }, 10000);
+    // آخرین تایمر شناخته شده بدون درخواست به سرور نمایش داده می‌شود
+    restore_active_timer();
+
+    // تلاش برای راه‌اندازی timer در navbar
+    setup_navbar_timer();
+    if (!$('#navbar-timer').length) {
+        wait_for_navbar();
+    }
+    
+    // دریافت تغییرات از طریق realtime و polling فقط به عنوان پشتیبان
+    setup_tab_coordination();
+    setup_realtime_updates();
+    setup_activity_tracking();
+    schedule_navbar_refresh();
+}
+
+// The navbar is rendered after document ready on some pages; watch the DOM
+// for it instead of polling, and give up after NAVBAR_WAIT_MS
+const NAVBAR_WAIT_MS = 10000;
+
+function wait_for_navbar() {
+    const observer = new MutationObserver(function() {
+        if (findNavbarContainer()) {
+            stop();
+            setup_navbar_timer();
         }
-        
-        // بروزرسانی هر 30 ثانیه
-        setInterval(refresh_navbar_timer, 30000);
-    }, 1000);
+    });
+    const timeout = setTimeout(stop, NAVBAR_WAIT_MS);
+
+    function stop() {
+        observer.disconnect();
+        clearTimeout(timeout);
+    }
+
+    observer.observe(document.body, {childList: true, subtree: true});
+}
+
+// The user's running timer ({task, subject, start_time}) shown on the navbar
+// icon. The last known value is kept in localStorage so it can be drawn at
+// boot, then replaced by the boot info, realtime deltas and navbar responses.
+const active_timer = {
+    current: null,
+    stop_ticker: null
+};
+
+function active_timer_key() {
+    return `better_project_active_timer:${frappe.session.user}`;
+}
+
+function restore_active_timer() {
+    try {
+        active_timer.current = JSON.parse(localStorage.getItem(active_timer_key()));
+    } catch (e) {
+        active_timer.current = null;
+    }
+    // The boot info is newer than any stored snapshot
+    if (frappe.boot && frappe.boot.better_project_active_timer !== undefined) {
+        set_active_timer(frappe.boot.better_project_active_timer);
+    }
+}
+
+function set_active_timer(timer) {
+    timer = timer && timer.task
+        ? {task: timer.task, subject: timer.subject, start_time: timer.start_time}
+        : null;
+    active_timer.current = timer;
+    try {
+        if (timer) {
+            localStorage.setItem(active_timer_key(), JSON.stringify(timer));
+        } else {
+            localStorage.removeItem(active_timer_key());
+        }
+    } catch (e) {
+        // localStorage may be full or disabled; the badge still works for this page
+    }
+    render_active_timer();
+}
+
+function render_active_timer() {
+    if (active_timer.stop_ticker) {
+        active_timer.stop_ticker();
+        active_timer.stop_ticker = null;
+    }
+    const badge = $('#navbar-timer .active-timer-badge');
+    const timer = active_timer.current;
+    if (!badge.length) {
+        return;
+    }
+    if (!timer) {
+        badge.addClass('hidden').empty();
+        return;
+    }
+
+    const start = moment(timer.start_time).toDate();
+    badge.removeClass('hidden')
+        .attr('title', timer.subject || timer.task)
+        .html(`
+            <span class="active-timer-subject">${frappe.utils.escape_html(timer.subject || timer.task)}</span>
+            <span class="active-timer-elapsed"></span>
+        `);
+    const elapsed = badge.find('.active-timer-elapsed');
+    active_timer.stop_ticker = better_project.ticker.subscribe(
+        now => elapsed.text(better_project.ticker.format(now - start)),
+        badge
+    );
+}
+
+// Polling intervals: with a live socket the server pushes deltas, so polling is
+// only a safety resync; without one we fall back to a slow poll.
+const NAVBAR_RESYNC_INTERVAL = 10 * 60 * 1000;
+const NAVBAR_FALLBACK_INTERVAL = 60 * 1000;
+// While the user is idle the interval doubles after every poll, up to this cap
+const NAVBAR_MAX_IDLE_INTERVAL = 30 * 60 * 1000;
+
+// Last user input and the number of polls since, for the idle backoff
+const navbar_activity = {
+    last: Date.now(),
+    idle_polls: 0
+};
+
+// Last data rendered in each tab, so realtime deltas can be applied in place
+const navbar_state = {
+    status: null,
+    // Team board paging; the version lets the server answer "unchanged"
+    status_total: 0,
+    status_page: 1,
+    status_version: null,
+    overdue: null,
+    today: null,
+    today_time: null,
+    // Last version token per navbar endpoint, sent back so unchanged data is skipped
+    versions: {},
+    // Actions started from this tab; their state comes back in the response,
+    // so the matching realtime delta must not be applied a second time
+    local_actions: new Set()
+};
+
+const NAVBAR_STATE_METHOD = 'better_project.doctype.task.task.get_navbar_state';
+
+// Calls a versioned navbar endpoint through the leader tab; `apply` runs only when the data changed.
+// The empty version opts in to versioned responses on the first call
+function call_navbar_endpoint(method, apply, args) {
+    better_project.tab_leader.call(method, Object.assign({version: ''}, args), function(message) {
+        if (!message || navbar_state.versions[method] === message.version) {
+            return;
+        }
+        navbar_state.versions[method] = message.version;
+        apply(message.data);
+    });
+}
+
+function apply_versioned_navbar_state(response) {
+    navbar_state.versions[NAVBAR_STATE_METHOD] = response.version;
+    apply_navbar_state(response.data);
+}
+
+// Only the leader tab calls the navbar endpoints and handles realtime events;
+// the other tabs of the user get both over the tab channel (see tab_leader.js)
+function setup_tab_coordination() {
+    const tabs = better_project.tab_leader;
+    tabs.init(frappe.session.user);
+
+    tabs.on('timer_delta', apply_timer_delta);
+    tabs.on('team_delta', apply_team_delta);
+    tabs.on('leadership', function(is_leader) {
+        if (is_leader) {
+            // تب قبلی بسته شده؛ رویدادهای از دست رفته را جبران کن
+            refresh_navbar_timer();
+            schedule_navbar_refresh();
+        }
+    });
+}
+
+function track_local_action(action, taskName) {
+    const key = `${action}:${taskName}`;
+    navbar_state.local_actions.add(key);
+    setTimeout(() => navbar_state.local_actions.delete(key), 30000);
+}
+
+function realtime_connected() {
+    return !!(frappe.realtime && frappe.realtime.socket && frappe.realtime.socket.connected);
+}
+
+function schedule_navbar_refresh() {
+    clearTimeout(window.navbar_refresh_timeout);
+    // Hidden tabs do not poll; visibilitychange resumes the loop
+    if (document.hidden) {
+        return;
+    }
+    const base = realtime_connected() ? NAVBAR_RESYNC_INTERVAL : NAVBAR_FALLBACK_INTERVAL;
+    const interval = Math.min(
+        base * Math.pow(2, navbar_activity.idle_polls),
+        Math.max(base, NAVBAR_MAX_IDLE_INTERVAL)
+    );
+    window.navbar_refresh_timeout = setTimeout(function() {
+        if (Date.now() - navbar_activity.last >= interval) {
+            navbar_activity.idle_polls += 1;
+        }
+        refresh_navbar_timer();
+        schedule_navbar_refresh();
+    }, interval);
+}
+
+function setup_activity_tracking() {
+    if (window.navbar_activity_ready) {
+        return;
+    }
+    window.navbar_activity_ready = true;
+
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            clearTimeout(window.navbar_refresh_timeout);
+            return;
+        }
+        // برگشت به تب: یک بار بروزرسانی و ادامه polling
+        navbar_activity.last = Date.now();
+        navbar_activity.idle_polls = 0;
+        refresh_navbar_timer();
+        schedule_navbar_refresh();
+    });
+
+    $(document).on('mousemove keydown click scroll touchstart', note_user_activity);
+}
+
+function note_user_activity() {
+    navbar_activity.last = Date.now();
+    if (navbar_activity.idle_polls) {
+        // کاربر بعد از مدتی بیکاری برگشته است
+        navbar_activity.idle_polls = 0;
+        refresh_navbar_timer();
+        schedule_navbar_refresh();
+    }
+}
+
+function navbar_dropdown_open() {
+    return $('#navbar-timer .dropdown-menu').hasClass('show');
+}
+
+function active_navbar_tab() {
+    return $('#navbar-timer .tab-pane.active').attr('id') || 'current-status';
+}
+
+function setup_realtime_updates() {
+    if (window.navbar_realtime_ready || !frappe.realtime) {
+        return;
+    }
+    window.navbar_realtime_ready = true;
+
+    // Every tab has a socket, but only the leader applies the events and forwards them
+    frappe.realtime.on('better_project_timer', function(delta) {
+        if (better_project.tab_leader.is_leader()) {
+            better_project.tab_leader.post('timer_delta', delta);
+            apply_timer_delta(delta);
+        }
+    });
+    frappe.realtime.on('better_project_team_status', function(delta) {
+        if (better_project.tab_leader.is_leader()) {
+            better_project.tab_leader.post('team_delta', delta);
+            apply_team_delta(delta);
+        }
+    });
+
+    // بعد از اتصال مجدد، رویدادهای از دست رفته را با یک بار بروزرسانی جبران کن
+    if (frappe.realtime.socket) {
+        frappe.realtime.socket.on('connect', function() {
+            refresh_navbar_timer();
+            schedule_navbar_refresh();
+        });
+        frappe.realtime.socket.on('disconnect', schedule_navbar_refresh);
+    }
+}
+
+function apply_team_delta(delta) {
+    if (!navbar_state.status) {
+        return;
+    }
+    const before = navbar_state.status.length;
+    navbar_state.status = navbar_state.status.filter(row => row.employee !== delta.employee);
+    navbar_state.status_total -= before - navbar_state.status.length;
+    // The server snapshot has changed as well
+    navbar_state.status_version = null;
+    if (delta.action === 'start') {
+        navbar_state.status_total += 1;
+        navbar_state.status.unshift({
+            employee: delta.employee,
+            employee_name: delta.employee_name,
+            user_image: delta.user_image,
+            task_name: delta.task_name,
+            task_subject: delta.task_subject,
+            start_time: delta.start_time
+        });
+    }
+    render_current_status();
+}
+
+function apply_timer_delta(delta) {
+    if (delta.action === 'start') {
+        set_active_timer({task: delta.task, subject: delta.subject, start_time: delta.start_time});
+    } else if (active_timer.current && active_timer.current.task === delta.task) {
+        set_active_timer(null);
+    }
+    if (navbar_state.local_actions.delete(`${delta.action}:${delta.task}`)) {
+        return;
+    }
+    if (delta.action === 'start') {
+        (delta.stopped || []).forEach(stopped => add_task_hours(stopped.task, stopped.hours));
+        const task = (navbar_state.today || []).find(row => row.name === delta.task);
+        if (!task) {
+            // تسک جدید در لیست امروز؛ اطلاعات کامل آن را از سرور بگیر
+            if (navbar_dropdown_open()) {
+                refresh_today_tasks();
+            }
+        } else {
+            task.is_active = 1;
+        }
+    } else if (delta.action === 'stop') {
+        add_task_hours(delta.task, delta.hours);
+    } else if (delta.action === 'complete') {
+        if (navbar_state.overdue) {
+            navbar_state.overdue = navbar_state.overdue.filter(row => row.name !== delta.task);
+            render_overdue_tasks();
+        }
+        const task = (navbar_state.today || []).find(row => row.name === delta.task);
+        if (task) {
+            task.progress = 100;
+        }
+    }
+    if (navbar_state.today) {
+        render_today_tasks();
+    }
+}
+
+function add_task_hours(taskName, hours) {
+    const task = (navbar_state.today || []).find(row => row.name === taskName);
+    if (task) {
+        task.total_hours_today = (task.total_hours_today || 0) + (hours || 0);
+        task.total_time = formatDuration(task.total_hours_today * 3600);
+        task.last_activity = moment().format('HH:mm:ss');
+        task.is_active = 0;
+    }
+
+    const item = (navbar_state.today_time || []).find(row => row.task_name === taskName);
+    if (item) {
+        item.hours += hours || 0;
+        item.total_time_formatted = formatDuration(item.hours * 3600);
+        update_time_chart('detailedTimeChart', navbar_state.today_time, false, false);
+    } else if (hours && navbar_state.today_time && navbar_dropdown_open()) {
+        refresh_time_charts();
+    }
 }
 
 function setup_timer_events() {
+    // The navbar element is recreated on every setup; its tab links need new handlers
+    setup_tab_events();
+
+    // Delegated handlers live on document and must be bound only once
+    if (window.navbar_events_ready) {
+        return;
+    }
+    window.navbar_events_ready = true;
+
     // کلیک روی آیکون Timer
     $(document).on('click', '#navbar-timer .timer-nav-link', function(e) {
         e.preventDefault();
@@ -215,11 +518,19 @@ function setup_timer_events() {
         }
     });
     
+    // صفحه بعدی وضعیت تیم
+    $(document).on('click', '#navbar-timer .load-more-status-btn', function(e) {
+        e.preventDefault();
+        load_more_current_status();
+    });
+
     // جلوگیری از بسته شدن dropdown با کلیک داخلی
     $(document).on('click', '#navbar-timer .dropdown-menu', function(e) {
         e.stopPropagation();
     });
+}
 
+function setup_tab_events() {
     // تغییر تب با جلوگیری از navigation
     $('#navbar-timer .nav-tabs .nav-link').on('click', function(e) {
         e.preventDefault();
@@ -243,11 +554,40 @@ function refresh_navbar_timer() {
     if (!frappe.session.user || frappe.session.user === 'Guest') {
         return;
     }
-    // بروزرسانی همه تب‌ها
-    refresh_current_status();
-    refresh_overdue_tasks();
-    refresh_today_tasks();
-    refresh_time_charts();
+    // فقط وقتی منو باز است و صفحه دیده می‌شود؛ با باز شدن منو دوباره صدا زده می‌شود
+    if (document.hidden || !navbar_dropdown_open()) {
+        return;
+    }
+    if (navbar_state.status === null) {
+        // اولین بار: همه تب‌ها با یک درخواست
+        call_navbar_endpoint(NAVBAR_STATE_METHOD, apply_navbar_state);
+        return;
+    }
+    // بعد از آن فقط تب باز و نمودار خلاصه بالای منو
+    const tab = active_navbar_tab();
+    refresh_current_tab(tab);
+    if (tab !== 'time-chart') {
+        refresh_summary_chart();
+    }
+}
+
+function apply_navbar_state(state) {
+    navbar_state.status = state.current_status || [];
+    navbar_state.status_total = state.current_status_total || navbar_state.status.length;
+    navbar_state.status_version = state.current_status_version || null;
+    navbar_state.status_page = 1;
+    navbar_state.overdue = state.overdue_tasks || [];
+    navbar_state.today = state.today_tasks || [];
+    navbar_state.today_time = state.today_time_data || [];
+    if (state.active_timer !== undefined) {
+        set_active_timer(state.active_timer);
+    }
+
+    render_current_status();
+    render_overdue_tasks();
+    render_today_tasks();
+    render_daily_project_chart(state.daily_project_time_data || []);
+    update_time_chart('detailedTimeChart', navbar_state.today_time, false, false);
 }
 
 function refresh_current_tab(tabId) {
@@ -271,144 +611,189 @@ function refresh_current_status() {
     if (!frappe.session.user || frappe.session.user === 'Guest') {
         return;
     }
-    frappe.call({
-        method: 'better_project.doctype.task.task.get_current_employees_status',
-        callback: function(r) {
-            const content = $('#current-status .current-status-content');
-            
-            if (!r.message || !r.message.length) {
-                content.html('<div class="text-muted text-center p-3">هیچ کارمندی در حال حاضر مشغول کار نیست</div>');
-            } else {
-                content.html(r.message.map(employee => `
-                    <div class="employee-status-card">
-                        <div class="employee-info">
-                            <img src="${employee.user_image || '/assets/frappe/images/default-avatar.png'}" 
-                                 class="employee-avatar" alt="${employee.employee_name}">
-                            <div class="employee-details">
-                                <div class="employee-name">${employee.employee_name}</div>
-                                ${employee.task_name ? `
-                                    <div class="task-info">
-                                        <a href="/app/task/${employee.task_name}" target="_blank">
-                                            ${employee.task_subject}
-                                        </a>
-                                        <div class="task-time">
-                                            <i class="fa fa-clock-o"></i>
-                                            از ${employee.start_time}
-                                        </div>
-                                    </div>
-                                ` : '<div class="text-muted">در حال حاضر مشغول کار نیست</div>'}
-                            </div>
-                        </div>
-                    </div>
-                `).join(''));
+    better_project.tab_leader.call(
+        'better_project.doctype.task.task.get_current_employees_status',
+        {page: 1},
+        function(message) {
+            if (!message) {
+                return;
             }
+            if (navbar_state.status_page === 1 && navbar_state.status_version === message.version) {
+                return;
+            }
+            navbar_state.status = message.rows || [];
+            navbar_state.status_total = message.total || 0;
+            navbar_state.status_version = message.version;
+            navbar_state.status_page = 1;
+            render_current_status();
         }
-    });
+    );
 }
 
-function refresh_overdue_tasks() {
-    if (!frappe.session.user || frappe.session.user === 'Guest') {
-        return;
-    }
+function load_more_current_status() {
     frappe.call({
-        method: 'better_project.doctype.task.task.get_my_overdue_tasks',
+        method: 'better_project.doctype.task.task.get_current_employees_status',
+        args: {page: navbar_state.status_page + 1},
         callback: function(r) {
-            const content = $('#overdue-tasks .overdue-tasks-content');
-            
-            if (!r.message || !r.message.length) {
-                content.html('<div class="text-muted text-center p-3">هیچ تسک معوقی ندارید</div>');
+            if (!r.message || !r.message.rows) {
                 return;
             }
+            const shown = new Set(navbar_state.status.map(row => row.employee));
+            navbar_state.status = navbar_state.status.concat(r.message.rows.filter(row => !shown.has(row.employee)));
+            navbar_state.status_total = r.message.total || 0;
+            navbar_state.status_page = r.message.page;
+            render_current_status();
+        }
+    });
+}
 
-            content.html(r.message.map(task => `
-                <div class="task-card overdue">
-                    <div class="task-header">
-                        <a href="/app/task/${task.name}" target="_blank" class="task-subject">
-                            ${task.subject}
-                        </a>
-                        <span class="days-overdue">${task.days_overdue} روز تاخیر</span>
-                    </div>
-                    <div class="task-details">
-                        <div class="detail-item">
-                            <i class="fa fa-calendar"></i>
-                            موعد: ${task.exp_end_date}
-                        </div>
-                        <div class="detail-item">
-                            <i class="fa fa-folder"></i>
-                            ${task.project}
-                        </div>
-                    </div>
-                    <div class="task-progress">
-                        <div class="progress">
-                            <div class="progress-bar" role="progressbar" 
-                                 style="width: ${task.progress}%"></div>
-                        </div>
-                        <small>${task.progress}% تکمیل شده</small>
+function render_current_status() {
+    const content = $('#current-status .current-status-content');
+    
+    if (!navbar_state.status.length) {
+        content.html('<div class="text-muted text-center p-3">هیچ کارمندی در حال حاضر مشغول کار نیست</div>');
+    } else {
+        content.html(navbar_state.status.map(employee => `
+            <div class="employee-status-card">
+                <div class="employee-info">
+                    <img src="${employee.user_image || '/assets/frappe/images/default-avatar.png'}" 
+                         class="employee-avatar" alt="${employee.employee_name}">
+                    <div class="employee-details">
+                        <div class="employee-name">${employee.employee_name}</div>
+                        ${employee.task_name ? `
+                            <div class="task-info">
+                                <a href="/app/task/${employee.task_name}" target="_blank">
+                                    ${employee.task_subject}
+                                </a>
+                                <div class="task-time">
+                                    <i class="fa fa-clock-o"></i>
+                                    از ${employee.start_time}
+                                </div>
+                            </div>
+                        ` : '<div class="text-muted">در حال حاضر مشغول کار نیست</div>'}
                     </div>
-                    <button class="btn btn-sm btn-primary start-task-btn" 
-                            onclick="start_task('${task.name}')">
-                        <i class="fa fa-play"></i> شروع کار
+                </div>
+            </div>
+        `).join(''));
+        if (navbar_state.status_total > navbar_state.status.length) {
+            content.append(`
+                <div class="text-center p-2">
+                    <button class="btn btn-sm btn-default load-more-status-btn">
+                        نمایش بیشتر (${navbar_state.status_total - navbar_state.status.length})
                     </button>
                 </div>
-            `).join(''));
+            `);
         }
+    }
+}
+
+function refresh_overdue_tasks() {
+    if (!frappe.session.user || frappe.session.user === 'Guest') {
+        return;
+    }
+    call_navbar_endpoint('better_project.doctype.task.task.get_my_overdue_tasks', function(data) {
+        navbar_state.overdue = data || [];
+        render_overdue_tasks();
     });
 }
 
+function render_overdue_tasks() {
+    const content = $('#overdue-tasks .overdue-tasks-content');
+    
+    if (!navbar_state.overdue.length) {
+        content.html('<div class="text-muted text-center p-3">هیچ تسک معوقی ندارید</div>');
+        return;
+    }
+
+    content.html(navbar_state.overdue.map(task => `
+        <div class="task-card overdue">
+            <div class="task-header">
+                <a href="/app/task/${task.name}" target="_blank" class="task-subject">
+                    ${task.subject}
+                </a>
+                <span class="days-overdue">${task.days_overdue} روز تاخیر</span>
+            </div>
+            <div class="task-details">
+                <div class="detail-item">
+                    <i class="fa fa-calendar"></i>
+                    موعد: ${task.exp_end_date}
+                </div>
+                <div class="detail-item">
+                    <i class="fa fa-folder"></i>
+                    ${task.project}
+                </div>
+            </div>
+            <div class="task-progress">
+                <div class="progress">
+                    <div class="progress-bar" role="progressbar" 
+                         style="width: ${task.progress}%"></div>
+                </div>
+                <small>${task.progress}% تکمیل شده</small>
+            </div>
+            <button class="btn btn-sm btn-primary start-task-btn" 
+                    onclick="start_task('${task.name}')">
+                <i class="fa fa-play"></i> شروع کار
+            </button>
+        </div>
+    `).join(''));
+}
+
 function refresh_today_tasks() {
     if (!frappe.session.user || frappe.session.user === 'Guest') {
         return;
     }
-    frappe.call({
-        method: 'better_project.doctype.task.task.get_my_today_tasks',
-        callback: function(r) {
-            const content = $('#today-tasks .today-tasks-content');
-            
-            if (!r.message || !r.message.length) {
-                content.html('<div class="text-muted text-center p-3">امروز هنوز روی هیچ تسکی کار نکرده‌اید</div>');
-                return;
-            }
+    call_navbar_endpoint('better_project.doctype.task.task.get_my_today_tasks', function(data) {
+        navbar_state.today = data || [];
+        render_today_tasks();
+    });
+}
 
-            content.html(r.message.map(task => `
-                <div class="task-card">
-                    <div class="task-header">
-                        <a href="/app/task/${task.name}" target="_blank" class="task-subject">
-                            ${task.subject}
-                        </a>
-                        <span class="total-time">${task.total_time} ساعت</span>
-                    </div>
-                    <div class="task-details">
-                        <div class="detail-item">
-                            <i class="fa fa-folder"></i>
-                            ${task.project}
-                        </div>
-                        <div class="detail-item">
-                            <i class="fa fa-clock-o"></i>
-                            آخرین فعالیت: ${task.last_activity}
-                        </div>
-                    </div>
-                    <div class="task-progress">
-                        <div class="progress">
-                            <div class="progress-bar" role="progressbar" 
-                                 style="width: ${task.progress}%"></div>
-                        </div>
-                        <small>${task.progress}% تکمیل شده</small>
-                    </div>
-                    ${task.is_active ? `
-                        <button class="btn btn-sm btn-warning stop-task-btn" 
-                                onclick="stop_task('${task.name}')">
-                            <i class="fa fa-pause"></i> توقف
-                        </button>
-                    ` : `
-                        <button class="btn btn-sm btn-primary start-task-btn" 
-                                onclick="start_task('${task.name}')">
-                            <i class="fa fa-play"></i> شروع کار
-                        </button>
-                    `}
+function render_today_tasks() {
+    const content = $('#today-tasks .today-tasks-content');
+    
+    if (!navbar_state.today.length) {
+        content.html('<div class="text-muted text-center p-3">امروز هنوز روی هیچ تسکی کار نکرده‌اید</div>');
+        return;
+    }
+
+    content.html(navbar_state.today.map(task => `
+        <div class="task-card">
+            <div class="task-header">
+                <a href="/app/task/${task.name}" target="_blank" class="task-subject">
+                    ${task.subject}
+                </a>
+                <span class="total-time">${task.total_time} ساعت</span>
+            </div>
+            <div class="task-details">
+                <div class="detail-item">
+                    <i class="fa fa-folder"></i>
+                    ${task.project}
                 </div>
-            `).join(''));
-        }
-    });
+                <div class="detail-item">
+                    <i class="fa fa-clock-o"></i>
+                    آخرین فعالیت: ${task.last_activity}
+                </div>
+            </div>
+            <div class="task-progress">
+                <div class="progress">
+                    <div class="progress-bar" role="progressbar" 
+                         style="width: ${task.progress}%"></div>
+                </div>
+                <small>${task.progress}% تکمیل شده</small>
+            </div>
+            ${task.is_active ? `
+                <button class="btn btn-sm btn-warning stop-task-btn" 
+                        onclick="stop_task('${task.name}')">
+                    <i class="fa fa-pause"></i> توقف
+                </button>
+            ` : `
+                <button class="btn btn-sm btn-primary start-task-btn" 
+                        onclick="start_task('${task.name}')">
+                    <i class="fa fa-play"></i> شروع کار
+                </button>
+            `}
+        </div>
+    `).join(''));
 }
 
 function refresh_time_charts() {
@@ -416,77 +801,91 @@ function refresh_time_charts() {
         return;
     }
 
-    // Get data for the 7-day summary chart (daily hours by project)
-    frappe.call({
-        method: 'better_project.doctype.task.task.get_my_daily_project_time_data', // Get daily project time
-        callback: function(r) {
-            if (!r.message || !r.message.length) {
-                // If no data, clear the summary chart
-                if (window.todayTimeChartChart) {
-                    window.todayTimeChartChart.destroy();
-                }
-                 // Display a message in the chart container
-                const summaryChartContainer = $('#today-chart-summary .chart-container');
-                summaryChartContainer.empty(); // Clear previous chart
-                summaryChartContainer.html('<div class="text-muted text-center p-3">آمار کاری هفتگی در دسترس نیست</div>');
+    refresh_summary_chart();
 
-                // Remove any previous text summary (already handled, but good to be sure)
-                $('#today-chart-summary .summary-text').remove();
-                $('#today-chart-summary h6').remove();
+    // Get data for the detailed chart (today's tasks time)
+    call_navbar_endpoint('better_project.doctype.task.task.get_my_today_time_data', function(data) {
+        navbar_state.today_time = data || [];
 
-                return;
-            }
+        // Update detailed chart
+        update_time_chart('detailedTimeChart', navbar_state.today_time, false, false); // isSummary = false, isStacked = false
+    });
+}
 
-            const timeData = r.message;
-            const dates = [...new Set(timeData.map(item => item.work_date))].sort(); // Get unique sorted dates
-            const projects = [...new Set(timeData.map(item => item.project_name || 'بدون پروژه'))]; // Get unique projects
-
-            // Create datasets for stacked bar chart
-            const datasets = projects.map(project => {
-                const projectData = timeData.filter(item => (item.project_name || 'بدون پروژه') === project);
-                const color = projectData.length > 0 ? (projectData[0].color || getRandomColor()) : getRandomColor(); // Get project color or random
-
-                return {
-                    label: project,
-                    data: dates.map(date => {
-                        const dayData = projectData.find(item => item.work_date === date);
-                        return dayData ? dayData.total_hours : 0;
-                    }),
-                    backgroundColor: color,
-                    borderColor: color,
-                    borderWidth: 1
-                };
-            });
-
-            // Update summary chart
-            update_time_chart('todayTimeChart', { labels: dates.map(date => moment(date).format('YYYY-MM-DD')), datasets: datasets }, true, true); // isSummary = true, isStacked = true
-            
-            // Remove any previous text summary (already handled, but good to be sure)
-            $('#today-chart-summary .summary-text').remove();
-            $('#today-chart-summary h6').remove();
-        }
+function refresh_summary_chart() {
+    // Get data for the 7-day summary chart (daily hours by project)
+    call_navbar_endpoint('better_project.doctype.task.task.get_my_daily_project_time_data', function(data) {
+        render_daily_project_chart(data || []);
     });
+}
 
-    // Get data for the detailed chart (today's tasks time)
-    frappe.call({
-        method: 'better_project.doctype.task.task.get_my_today_time_data', // Get today's tasks time
-        callback: function(r) {
-            if (!r.message) return;
+function render_daily_project_chart(timeData) {
+    if (!timeData.length) {
+        // If no data, clear the summary chart
+        if (window.todayTimeChartChart) {
+            window.todayTimeChartChart.destroy();
+        }
+         // Display a message in the chart container
+        const summaryChartContainer = $('#today-chart-summary .chart-container');
+        summaryChartContainer.empty(); // Clear previous chart
+        summaryChartContainer.html('<div class="text-muted text-center p-3">آمار کاری هفتگی در دسترس نیست</div>');
 
-            console.log('Detailed Chart Data received:', r.message); // Debug log
+        // Remove any previous text summary (already handled, but good to be sure)
+        $('#today-chart-summary .summary-text').remove();
+        $('#today-chart-summary h6').remove();
 
-            // Update detailed chart
-            update_time_chart('detailedTimeChart', r.message, false, false); // isSummary = false, isStacked = false
-        }
+        return;
+    }
+
+    const dates = [...new Set(timeData.map(item => item.work_date))].sort(); // Get unique sorted dates
+    const projects = [...new Set(timeData.map(item => item.project_name || 'بدون پروژه'))]; // Get unique projects
+
+    // Create datasets for stacked bar chart
+    const datasets = projects.map(project => {
+        const projectData = timeData.filter(item => (item.project_name || 'بدون پروژه') === project);
+        const color = projectData.length > 0 ? (projectData[0].color || getRandomColor()) : getRandomColor(); // Get project color or random
+
+        return {
+            label: project,
+            data: dates.map(date => {
+                const dayData = projectData.find(item => item.work_date === date);
+                return dayData ? dayData.total_hours : 0;
+            }),
+            backgroundColor: color,
+            borderColor: color,
+            borderWidth: 1
+        };
     });
+
+    // Update summary chart
+    update_time_chart('todayTimeChart', { labels: dates.map(date => moment(date).format('YYYY-MM-DD')), datasets: datasets }, true, true); // isSummary = true, isStacked = true
+    
+    // Remove any previous text summary (already handled, but good to be sure)
+    $('#today-chart-summary .summary-text').remove();
+    $('#today-chart-summary h6').remove();
+}
+
+// Chart.js is served from this app's assets and loaded the first time a chart is drawn
+let chart_js_loading = null;
+
+function load_chart_js() {
+    if (typeof Chart !== 'undefined') {
+        return Promise.resolve();
+    }
+    if (!chart_js_loading) {
+        chart_js_loading = new Promise(resolve => frappe.require('chart.bundle.js', resolve));
+    }
+    return chart_js_loading;
 }
 
 function update_time_chart(canvasId, data, isSummary = false, isStacked = false) {
+    load_chart_js().then(() => draw_time_chart(canvasId, data, isSummary, isStacked));
+}
+
+function draw_time_chart(canvasId, data, isSummary, isStacked) {
     const ctx = document.getElementById(canvasId);
     if (!ctx) return; // Ensure canvas exists
 
-    console.log(`Updating chart ${canvasId} with data:`, data); // Debug log
-    console.log(`isSummary: ${isSummary}, isStacked: ${isStacked}`); // Debug log
 
     const chartType = isStacked ? 'bar' : 'bar'; // Both are bar charts, just stacked for summary
 
@@ -601,16 +1000,20 @@ function start_task(taskName) {
         });
         return;
     }
+    track_local_action('start', taskName);
     frappe.call({
         method: 'better_project.api.task_timer.start_timer',
-        args: { task: taskName },
+        args: { task: taskName, include_navbar_state: 1 },
         callback: function(r) {
             if (r.message && r.message.success) {
                 frappe.show_alert({
                     message: 'تایمر با موفقیت شروع شد',
                     indicator: 'green'
                 });
-                refresh_navbar_timer();
+                // وضعیت جدید همراه پاسخ برگشته است؛ نیازی به درخواست مجدد نیست
+                if (r.message.navbar_state) {
+                    apply_versioned_navbar_state(r.message.navbar_state);
+                }
             } else {
                 frappe.show_alert({
                     message: r.message?.error || 'خطا در شروع تایمر',
@@ -629,16 +1032,20 @@ function stop_task(taskName) {
         });
         return;
     }
+    track_local_action('stop', taskName);
     frappe.call({
         method: 'better_project.api.task_timer.stop_timer',
-        args: { task: taskName },
+        args: { task: taskName, include_navbar_state: 1 },
         callback: function(r) {
             if (r.message && r.message.success) {
                 frappe.show_alert({
                     message: 'تایمر با موفقیت متوقف شد',
                     indicator: 'orange'
                 });
-                refresh_navbar_timer();
+                // وضعیت جدید همراه پاسخ برگشته است؛ نیازی به درخواست مجدد نیست
+                if (r.message.navbar_state) {
+                    apply_versioned_navbar_state(r.message.navbar_state);
+                }
             } else {
                 frappe.show_alert({
                     message: r.message?.error || 'خطا در توقف تایمر',
@@ -653,6 +1060,33 @@ function add_timer_styles() {
     if (!$('#navbar-timer-styles').length) {
         $('head').append(`
             <style id="navbar-timer-styles">
+                /* Running timer next to the navbar icon */
+                #navbar-timer .active-timer-badge {
+                    display: inline-flex;
+                    gap: 4px;
+                    margin-inline-start: 4px;
+                    padding: 1px 6px;
+                    border-radius: 10px;
+                    font-size: 11px;
+                    background-color: #e8f5e9;
+                    color: #2e7d32;
+                }
+
+                #navbar-timer .active-timer-badge.hidden {
+                    display: none;
+                }
+
+                #navbar-timer .active-timer-subject {
+                    max-width: 120px;
+                    overflow: hidden;
+                    text-overflow: ellipsis;
+                    white-space: nowrap;
+                }
+
+                #navbar-timer .active-timer-elapsed {
+                    font-variant-numeric: tabular-nums;
+                }
+
                 /* Navbar Timer Container */
                 #navbar-timer .timer-dropdown {
                     width: 400px;
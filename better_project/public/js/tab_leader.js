@@ -0,0 +1,180 @@
+// Cross-tab coordination for the timer UI.
+// The desk tabs of one user elect a leader through a lease in localStorage;
+// only the leader makes the timer status calls and handles realtime events,
+// and it shares the results with the other tabs over a BroadcastChannel (see
+// `call`). Without BroadcastChannel every tab simply acts as its own leader.
+
+frappe.provide('better_project');
+
+better_project.tab_leader = {
+    // A leader that stops renewing its lease (closed, frozen) is replaced after this long
+    LEASE_MS: 10000,
+    HEARTBEAT_MS: 4000,
+    // A follower whose request gets no answer in this long makes the call itself
+    CALL_TIMEOUT_MS: 3000,
+
+    id: Math.random().toString(36).slice(2),
+    leader: false,
+    channel: undefined,
+    handlers: {},
+    // Follower: callbacks waiting for the leader, by call key
+    pending: {},
+    // Calls in flight from this tab, by call key
+    fetching: {},
+    // Last full response of each versioned call, by call key
+    responses: {},
+
+    init(user) {
+        if (this.channel !== undefined) {
+            return;
+        }
+        if (typeof BroadcastChannel === 'undefined' || !window.localStorage) {
+            this.channel = null;
+            this.set_leader(true);
+            return;
+        }
+
+        this.key = `better_project_timer_leader:${user}`;
+        this.channel = new BroadcastChannel(`better_project_timer:${user}`);
+        this.channel.onmessage = e => this.dispatch(e.data.type, e.data.payload);
+
+        this.on('leader_gone', () => this.elect());
+        this.on('call_request', request => {
+            if (this.leader) {
+                this.fetch(request.key, request.method, request.args);
+            }
+        });
+        this.on('call_result', result => this.resolve(result.key, result.message));
+        window.addEventListener('pagehide', () => this.resign());
+
+        this.elect();
+        setInterval(() => this.elect(), this.HEARTBEAT_MS);
+    },
+
+    is_leader() {
+        return this.leader;
+    },
+
+    // Sends a message to every other tab of this user
+    post(type, payload) {
+        if (this.channel) {
+            this.channel.postMessage({type, payload});
+        }
+    },
+
+    // Handles messages from other tabs; 'leadership' fires locally when this tab gains or loses it
+    on(type, callback) {
+        (this.handlers[type] = this.handlers[type] || []).push(callback);
+    },
+
+    dispatch(type, payload) {
+        (this.handlers[type] || []).forEach(callback => callback(payload));
+    },
+
+    // Calls a whitelisted method once for all tabs: a follower asks the leader,
+    // which makes the call and shares the response. The leader sends back the
+    // version of the last response of a versioned method and answers a
+    // not_modified reply from it, so `callback` always gets a full response.
+    call(method, args, callback) {
+        const key = JSON.stringify([method, args || {}]);
+        if (this.leader || !this.channel) {
+            this.fetch(key, method, args, callback);
+            return;
+        }
+
+        let pending = this.pending[key];
+        if (!pending) {
+            pending = this.pending[key] = {callbacks: []};
+            pending.timer = setTimeout(() => {
+                // The leader is closing or frozen
+                delete this.pending[key];
+                this.fetch(key, method, args, message => pending.callbacks.forEach(cb => cb(message)));
+            }, this.CALL_TIMEOUT_MS);
+            this.post('call_request', {key, method, args});
+        }
+        pending.callbacks.push(callback);
+    },
+
+    fetch(key, method, args, callback) {
+        const waiting = this.fetching[key];
+        if (waiting) {
+            // The response of the call in flight goes to every tab anyway
+            if (callback) {
+                waiting.push(callback);
+            }
+            return;
+        }
+
+        const callbacks = this.fetching[key] = callback ? [callback] : [];
+        const cached = this.responses[key];
+        frappe.call({
+            method: method,
+            args: Object.assign({}, args, cached ? {version: cached.version} : {}),
+            callback: r => {
+                let message = r.message;
+                if (message && message.not_modified) {
+                    message = cached;
+                } else if (message && message.version !== undefined) {
+                    this.responses[key] = message;
+                }
+                // An empty response still answers the tabs waiting on it
+                message = message || null;
+                callbacks.forEach(cb => cb(message));
+                if (this.leader) {
+                    this.post('call_result', {key, message});
+                }
+            },
+            always: () => {
+                delete this.fetching[key];
+            }
+        });
+    },
+
+    resolve(key, message) {
+        const pending = this.pending[key];
+        if (!pending) {
+            return;
+        }
+        clearTimeout(pending.timer);
+        delete this.pending[key];
+        pending.callbacks.forEach(cb => cb(message));
+    },
+
+    elect() {
+        const lease = this.read_lease();
+        const now = Date.now();
+        if (lease && lease.id !== this.id && lease.expires > now) {
+            this.set_leader(false);
+            return;
+        }
+        localStorage.setItem(this.key, JSON.stringify({id: this.id, expires: now + this.LEASE_MS}));
+        // Two tabs may claim at the same moment; the last write wins
+        setTimeout(() => {
+            const current = this.read_lease();
+            this.set_leader(!!current && current.id === this.id);
+        }, 50);
+    },
+
+    resign() {
+        if (this.leader && this.channel) {
+            localStorage.removeItem(this.key);
+            this.post('leader_gone');
+        }
+    },
+
+    read_lease() {
+        try {
+            return JSON.parse(localStorage.getItem(this.key));
+        } catch (e) {
+            return null;
+        }
+    },
+
+    set_leader(value) {
+        if (value === this.leader) {
+            return;
+        }
+        this.leader = value;
+        this.dispatch('leadership', value);
+    }
+};
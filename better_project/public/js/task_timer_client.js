@@ -1,11 +1,12 @@
 // Task Timer Client Script
-// این کد باید در hooks.py فایل اضافه شود به عنوان app_include_js
+// از طریق doctype_js در hooks.py فقط همراه فرم Task بارگذاری می‌شود
 
 class TaskTimer {
     constructor(frm) {
         this.frm = frm;
         this.task_name = frm.doc.name;
-        this.timer_interval = null;
+        // Unsubscribe function of the shared ticker while the timer is shown
+        this.stop_ticker = null;
         this.start_time = null;
         this.elapsed_time = 0;
         this.is_running = false;
@@ -77,7 +78,8 @@ class TaskTimer {
         `;
         
         // اضافه کردن به فرم
-        $(this.frm.fields_dict.subject.wrapper).after(timer_html);
+        this.section = $(timer_html);
+        $(this.frm.fields_dict.subject.wrapper).after(this.section);
         
         // اضافه کردن Event Handlers
         $('#start-timer-btn').on('click', () => this.start_timer());
@@ -274,76 +276,62 @@ class TaskTimer {
     
     start_timer_update() {
         this.stop_timer_update(); // توقف Timer قبلی
-        this.timer_interval = setInterval(() => {
-            this.update_timer_display();
-        }, 1000);
+        this.stop_ticker = better_project.ticker.subscribe(
+            now => this.update_timer_display(now),
+            this.section
+        );
     }
     
     stop_timer_update() {
-        if (this.timer_interval) {
-            clearInterval(this.timer_interval);
-            this.timer_interval = null;
+        if (this.stop_ticker) {
+            this.stop_ticker();
+            this.stop_ticker = null;
         }
     }
     
-    update_timer_display() {
+    destroy() {
+        // قبل از ساختن نمونه جدید روی همان فرم
+        this.stop_timer_update();
+    }
+    
+    update_timer_display(now) {
         if (!this.is_running || !this.start_time) return;
         
-        const now = new Date();
-        const elapsed_seconds = Math.floor((now - this.start_time) / 1000);
-        
-        const hours = Math.floor(elapsed_seconds / 3600);
-        const minutes = Math.floor((elapsed_seconds % 3600) / 60);
-        const seconds = elapsed_seconds % 60;
-        
-        const display = `${hours.toString().padStart(2, '0')}:${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
-        $('#current-timer').text(display);
+        this.section.find('#current-timer').text(better_project.ticker.format((now || new Date()) - this.start_time));
     }
     
-    async check_timer_status() {
-        try {
-            const response = await frappe.call({
-        method: 'better_project.api.task_timer.get_timer_status',
-        args: {
-                    task_name: this.task_name
+    check_timer_status() {
+        // تب اصلی کاربر درخواست را برای همه تب‌ها می‌فرستد (tab_leader.js)
+        better_project.tab_leader.init(frappe.session.user);
+        better_project.tab_leader.call(
+            'better_project.api.task_timer.get_timer_status',
+            {task_name: this.task_name},
+            message => {
+                if (message && message.is_running) {
+                    this.is_running = true;
+                    this.start_time = new Date(message.start_time);
+                    
+                    // بروزرسانی UI
+                    this.update_ui_for_running_timer();
+                    
+                    // شروع بروزرسانی Timer
+                    this.start_timer_update();
                 }
-            });
-            
-            if (response.message && response.message.is_running) {
-                this.is_running = true;
-                this.start_time = new Date(response.message.start_time);
                 
-                // بروزرسانی UI
-                this.update_ui_for_running_timer();
-                
-                // شروع بروزرسانی Timer
-                this.start_timer_update();
-}
-
-            // بروزرسانی مجموع زمان
-            this.update_total_time();
-            
-        } catch (error) {
-            console.error('Error checking timer status:', error);
-        }
+                // بروزرسانی مجموع زمان
+                this.update_total_time();
+            }
+        );
     }
     
-    async update_total_time() {
-        try {
-            const response = await frappe.call({
-        method: 'better_project.api.task_timer.get_task_time_info',
-        args: {
-                    task_name: this.task_name
-                }
-            });
-            
-            if (response.message) {
-                const total_formatted = response.message.total_time_formatted || '00:00:00';
-                $('#total-time').text(total_formatted);
+    update_total_time() {
+        better_project.tab_leader.call(
+            'better_project.api.task_timer.get_task_time_info',
+            {task_name: this.task_name},
+            message => {
+                $('#total-time').text((message && message.total_time_formatted) || '00:00:00');
             }
-        } catch (error) {
-            console.error('Error updating total time:', error);
-        }
+        );
     }
     
     configure_status_field() {
@@ -368,7 +356,11 @@ frappe.ui.form.on('Task', {
         if (!frm.doc.__islocal && frm.doc.name) {
             // تاخیر کوتاه برای اطمینان از بارگذاری کامل فرم
             setTimeout(() => {
-                new TaskTimer(frm);
+                // هر فرم فقط یک نمونه فعال دارد
+                if (frm.task_timer_client) {
+                    frm.task_timer_client.destroy();
+                }
+                frm.task_timer_client = new TaskTimer(frm);
             }, 500);
                 }
     },
@@ -0,0 +1,74 @@
+// Shared one-second ticker for running-timer displays.
+// Every widget subscribes here instead of starting its own setInterval, so a
+// page never runs more than one interval however many forms have been opened.
+// The interval only runs while there are subscribers and pauses in hidden tabs.
+
+frappe.provide('better_project');
+
+better_project.ticker = {
+    subscribers: new Set(),
+    interval: null,
+
+    // Calls `callback(now)` every second (and once right away) until the
+    // returned function is called. With `element`, the subscription ends by
+    // itself once the element leaves the page and is skipped while hidden.
+    subscribe(callback, element) {
+        const subscriber = {callback, element: element && $(element)[0]};
+        this.subscribers.add(subscriber);
+        this.run(subscriber, new Date());
+        this.sync();
+        return () => {
+            this.subscribers.delete(subscriber);
+            this.sync();
+        };
+    },
+
+    run(subscriber, now) {
+        const element = subscriber.element;
+        if (element && !element.isConnected) {
+            this.subscribers.delete(subscriber);
+            return;
+        }
+        if (element && !element.offsetParent) {
+            return;
+        }
+        try {
+            subscriber.callback(now);
+        } catch (e) {
+            console.error(e);
+        }
+    },
+
+    tick() {
+        const now = new Date();
+        this.subscribers.forEach(subscriber => this.run(subscriber, now));
+        this.sync();
+    },
+
+    sync() {
+        const needed = this.subscribers.size > 0 && !document.hidden;
+        if (needed && !this.interval) {
+            this.interval = setInterval(() => this.tick(), 1000);
+        } else if (!needed && this.interval) {
+            clearInterval(this.interval);
+            this.interval = null;
+        }
+    },
+
+    format(milliseconds) {
+        const total = Math.max(Math.floor(milliseconds / 1000), 0);
+        const hours = Math.floor(total / 3600);
+        const minutes = Math.floor((total % 3600) / 60);
+        const seconds = total % 60;
+        return [hours, minutes, seconds].map(part => part.toString().padStart(2, '0')).join(':');
+    }
+};
+
+document.addEventListener('visibilitychange', function() {
+    if (!document.hidden) {
+        // Catch up right away instead of waiting for the next second
+        better_project.ticker.tick();
+    } else {
+        better_project.ticker.sync();
+    }
+});
@@ -0,0 +1,449 @@
+"""SQL shared by the timer API, the Task hooks, notifications and the dashboards.
+
+Each statement lives here once so it can be tuned and indexed in one place.
+Date filters are half-open datetime ranges on the raw column (see
+``day_range``) so the indexes on ``from_time`` stay usable, and every query
+selects only the columns its callers read. Each query function registers the
+arguments ``query_plans`` EXPLAINs it with through ``plan_check``, once per
+shape of statement its callers produce.
+"""
+
+import frappe
+from frappe.utils import add_days, get_datetime, getdate, now_datetime
+
+TIME_ROLLUP_TABLE = "__better_project_time_rollup"
+TASK_ASSIGNEE_TABLE = "__better_project_task_assignee"
+
+# (function, sample keyword arguments) registered with ``plan_check``
+PLAN_CHECKS = []
+
+# Sample arguments of the plan checks
+SAMPLE_NAME = "sample"
+SAMPLE_DATE = "2000-01-01"
+SAMPLE_DATETIME = "2000-01-01 00:00:00"
+
+
+def plan_check(**sample):
+    """Register a query function for ``query_plans`` to EXPLAIN with these arguments"""
+    def register(function):
+        PLAN_CHECKS.append((function, sample))
+        return function
+    return register
+
+
+def day_range(from_date, to_date=None):
+    """Half-open datetime range [from_date 00:00, day after to_date 00:00)"""
+    to_date = to_date or from_date
+    return get_datetime(getdate(from_date)), get_datetime(add_days(getdate(to_date), 1))
+
+
+@plan_check(employee=SAMPLE_NAME, from_date=SAMPLE_DATE, to_date=SAMPLE_DATE)
+def get_employee_timesheets(employee, from_date, to_date):
+    """Non-cancelled timesheets of an employee overlapping a date range, newest first"""
+    return frappe.db.sql("""
+        SELECT name, start_date, end_date, docstatus
+        FROM `tabTimesheet`
+        WHERE employee = %(employee)s
+        AND docstatus < 2
+        AND start_date <= %(to_date)s
+        AND end_date >= %(from_date)s
+        ORDER BY start_date DESC
+    """, {"employee": employee, "from_date": getdate(from_date), "to_date": getdate(to_date)}, as_dict=1)
+
+
+@plan_check(employee=SAMPLE_NAME, day=SAMPLE_DATE)
+@plan_check(employee=SAMPLE_NAME, day=SAMPLE_DATE, project=SAMPLE_NAME)
+def get_current_timesheet(employee, day, project=None):
+    """Newest draft Timesheet of an employee covering a day, optionally for one project"""
+    conditions = [
+        "employee = %(employee)s",
+        "docstatus = 0",
+        "start_date <= %(day)s",
+        "end_date >= %(day)s"
+    ]
+    if project:
+        conditions.append("project = %(project)s")
+
+    result = frappe.db.sql(f"""
+        SELECT name
+        FROM `tabTimesheet`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY creation DESC
+        LIMIT 1
+    """, {"employee": employee, "day": getdate(day), "project": project})
+    return result[0][0] if result else None
+
+
+@plan_check(employee=SAMPLE_NAME)
+@plan_check(task=SAMPLE_NAME)
+def get_open_time_logs(employee=None, task=None):
+    """Open time logs on draft timesheets of an employee or a task, newest first"""
+    conditions = ["td.to_time IS NULL", "ts.docstatus = 0"]
+    if employee:
+        conditions.append("ts.employee = %(employee)s")
+    if task:
+        conditions.append("td.task = %(task)s")
+
+    return frappe.db.sql(f"""
+        SELECT
+            td.name as time_log,
+            td.parent as timesheet,
+            ts.employee,
+            td.task,
+            td.project,
+            td.from_time
+        FROM `tabTimesheet` ts
+        JOIN `tabTimesheet Detail` td ON td.parent = ts.name
+        WHERE {" AND ".join(conditions)}
+        ORDER BY td.creation DESC
+    """, {"employee": employee, "task": task}, as_dict=1)
+
+
+@plan_check(employee=SAMPLE_NAME)
+def lock_employee(employee):
+    """Take the row lock of an employee until the transaction ends"""
+    return frappe.db.sql("""
+        SELECT name
+        FROM `tabEmployee`
+        WHERE name = %s
+        FOR UPDATE
+    """, (employee,))
+
+
+@plan_check(to_time=SAMPLE_DATETIME, employee=SAMPLE_NAME)
+@plan_check(to_time=SAMPLE_DATETIME, employee=SAMPLE_NAME, task=SAMPLE_NAME)
+@plan_check(to_time=SAMPLE_DATETIME, employee=SAMPLE_NAME, task_logs_only=True)
+@plan_check(to_time=SAMPLE_DATETIME, task=SAMPLE_NAME)
+def lock_open_time_logs(to_time, employee=None, task=None, task_logs_only=False):
+    """Open time logs of an employee and/or a task with their hours up to to_time, locked for update"""
+    conditions = ["td.to_time IS NULL", "ts.docstatus = 0"]
+    if employee:
+        conditions.append("ts.employee = %(employee)s")
+    if task:
+        conditions.append("td.task = %(task)s")
+    if task_logs_only:
+        conditions.append("td.task IS NOT NULL")
+
+    return frappe.db.sql(f"""
+        SELECT
+            td.name as time_log,
+            td.parent as timesheet,
+            ts.employee,
+            td.task,
+            td.project,
+            td.from_time,
+            GREATEST(TIMESTAMPDIFF(MICROSECOND, td.from_time, %(to_time)s), 0) / 3600000000 as hours
+        FROM `tabTimesheet` ts
+        JOIN `tabTimesheet Detail` td ON td.parent = ts.name
+        WHERE {" AND ".join(conditions)}
+        ORDER BY td.creation DESC
+        FOR UPDATE
+    """, {"employee": employee, "task": task, "to_time": to_time}, as_dict=1)
+
+
+@plan_check(time_logs=[SAMPLE_NAME], to_time=SAMPLE_DATETIME)
+def close_time_logs(time_logs, to_time):
+    """Stamp to_time and set hours and billing hours of open time logs in one statement"""
+    frappe.db.sql("""
+        UPDATE `tabTimesheet Detail`
+        SET
+            to_time = %(to_time)s,
+            hours = GREATEST(TIMESTAMPDIFF(MICROSECOND, from_time, %(to_time)s), 0) / 3600000000,
+            billing_hours = GREATEST(TIMESTAMPDIFF(MICROSECOND, from_time, %(to_time)s), 0) / 3600000000,
+            modified = %(modified)s,
+            modified_by = %(user)s
+        WHERE name IN %(time_logs)s
+        AND to_time IS NULL
+    """, {
+        "time_logs": tuple(time_logs),
+        "to_time": to_time,
+        "modified": now_datetime(),
+        "user": frappe.session.user
+    })
+
+
+# Stale open logs closed per transaction
+STALE_BATCH_SIZE = 500
+
+# End time given to a stale open log: its start if it has no task (a placeholder
+# log), otherwise the earliest of now, the end of its day and max hours after it
+STALE_TO_TIME = """
+    CASE
+        WHEN td.task IS NULL THEN td.from_time
+        ELSE LEAST(
+            %(now)s,
+            td.from_time + INTERVAL %(max_seconds)s SECOND,
+            IF(%(midnight)s, TIMESTAMP(DATE(td.from_time)) + INTERVAL 1 DAY - INTERVAL 1 MICROSECOND, %(now)s)
+        )
+    END
+"""
+
+# Open time logs without a task, started before today (with ``midnight``) or more
+# than max_seconds ago. Logs without a start cannot be capped and are left alone.
+STALE_CONDITIONS = """
+    td.to_time IS NULL
+    AND td.from_time IS NOT NULL
+    AND ts.docstatus = 0
+    AND (
+        td.task IS NULL
+        OR td.from_time < %(now)s - INTERVAL %(max_seconds)s SECOND
+        OR (%(midnight)s AND td.from_time < TIMESTAMP(DATE(%(now)s)))
+    )
+"""
+
+
+@plan_check(now=SAMPLE_DATETIME, max_seconds=3600, midnight=1)
+def get_stale_time_log_employees(now, max_seconds, midnight):
+    """Employees of the next batch of stale open time logs, in name order; nothing is locked"""
+    return frappe.db.sql(f"""
+        SELECT DISTINCT batch.employee
+        FROM (
+            SELECT ts.employee
+            FROM `tabTimesheet Detail` td
+            JOIN `tabTimesheet` ts ON ts.name = td.parent
+            WHERE {STALE_CONDITIONS}
+            ORDER BY td.from_time
+            LIMIT {STALE_BATCH_SIZE}
+        ) batch
+        ORDER BY batch.employee
+    """, {"now": now, "max_seconds": max_seconds, "midnight": midnight}, pluck=True)
+
+
+@plan_check(employees=[SAMPLE_NAME])
+def lock_employees(employees):
+    """Take the row locks of several employees, in name order, until the transaction ends"""
+    return frappe.db.sql("""
+        SELECT name
+        FROM `tabEmployee`
+        WHERE name IN %(employees)s
+        ORDER BY name
+        FOR UPDATE
+    """, {"employees": tuple(employees)}, pluck=True)
+
+
+@plan_check(now=SAMPLE_DATETIME, max_seconds=3600, midnight=1, employees=[SAMPLE_NAME])
+def lock_stale_time_logs(now, max_seconds, midnight, employees):
+    """Stale open time logs of the given employees with the end time they are capped at;
+    one batch, locked for update. Lock the employees first (see ``lock_employees``)."""
+    return frappe.db.sql(f"""
+        SELECT
+            td.name as time_log,
+            td.parent as timesheet,
+            ts.employee,
+            td.task,
+            td.project,
+            td.from_time,
+            {STALE_TO_TIME} as to_time
+        FROM `tabTimesheet Detail` td
+        JOIN `tabTimesheet` ts ON ts.name = td.parent
+        WHERE {STALE_CONDITIONS}
+        AND ts.employee IN %(employees)s
+        ORDER BY td.from_time
+        LIMIT {STALE_BATCH_SIZE}
+        FOR UPDATE
+    """, {"now": now, "max_seconds": max_seconds, "midnight": midnight, "employees": tuple(employees)}, as_dict=1)
+
+
+@plan_check(time_logs=[SAMPLE_NAME], now=SAMPLE_DATETIME, max_seconds=3600, midnight=1, note=SAMPLE_NAME)
+def cap_time_logs(time_logs, now, max_seconds, midnight, note):
+    """Close stale open time logs at their capped end time and append a note to their description"""
+    to_time = f"({STALE_TO_TIME})"
+    frappe.db.sql(f"""
+        UPDATE `tabTimesheet Detail` td
+        SET
+            td.hours = GREATEST(TIMESTAMPDIFF(MICROSECOND, td.from_time, {to_time}), 0) / 3600000000,
+            td.billing_hours = GREATEST(TIMESTAMPDIFF(MICROSECOND, td.from_time, {to_time}), 0) / 3600000000,
+            td.to_time = {to_time},
+            td.description = CONCAT_WS(' ', td.description, %(note)s),
+            td.modified = %(modified)s,
+            td.modified_by = %(user)s
+        WHERE td.name IN %(time_logs)s
+        AND td.to_time IS NULL
+    """, {
+        "time_logs": tuple(time_logs),
+        "now": now,
+        "max_seconds": max_seconds,
+        "midnight": midnight,
+        "note": note,
+        "modified": now_datetime(),
+        "user": frappe.session.user
+    })
+
+
+@plan_check()
+def get_team_open_timers():
+    """Open timers of every employee, for the team status board"""
+    return frappe.db.sql("""
+        SELECT
+            task.name as task_name,
+            task.subject as task_subject,
+            td.project,
+            emp.name as employee,
+            emp.employee_name as employee_name,
+            emp.department,
+            user.user_image as user_image,
+            td.from_time as start_time
+        FROM `tabTimesheet` ts
+        JOIN `tabTimesheet Detail` td ON td.parent = ts.name
+        JOIN `tabTask` task ON task.name = td.task
+        JOIN `tabEmployee` emp ON emp.name = ts.employee
+        JOIN `tabUser` user ON user.name = emp.user_id
+        WHERE ts.docstatus = 0
+        AND td.to_time IS NULL
+        ORDER BY td.from_time DESC
+    """, as_dict=1)
+
+
+@plan_check(task=SAMPLE_NAME)
+@plan_check(task=SAMPLE_NAME, employee=SAMPLE_NAME)
+def get_task_hours(task, employee=None):
+    """Hours logged on a task in submitted timesheets, optionally for one employee"""
+    conditions = ["task = %(task)s"]
+    if employee:
+        conditions.append("employee = %(employee)s")
+
+    return frappe.db.sql(f"""
+        SELECT SUM(submitted_hours)
+        FROM `{TIME_ROLLUP_TABLE}`
+        WHERE {" AND ".join(conditions)}
+    """, {"task": task, "employee": employee})[0][0] or 0
+
+
+@plan_check(employee=SAMPLE_NAME, from_date=SAMPLE_DATE, to_date=SAMPLE_DATE)
+def get_rollup_rows(employee, from_date, to_date):
+    """Daily rollup rows of an employee between two dates, with task and project details"""
+    return frappe.db.sql(f"""
+        SELECT
+            r.work_date,
+            r.task,
+            r.project,
+            r.hours,
+            r.log_count,
+            r.submitted_hours,
+            r.submitted_log_count,
+            r.last_from_time,
+            r.last_to_time,
+            t.subject,
+            t.status,
+            t.progress,
+            p.project_name,
+            p.color
+        FROM `{TIME_ROLLUP_TABLE}` r
+        LEFT JOIN `tabTask` t ON t.name = r.task
+        LEFT JOIN `tabProject` p ON p.name = r.project
+        WHERE r.employee = %s
+        AND r.work_date BETWEEN %s AND %s
+    """, (employee, getdate(from_date), getdate(to_date)), as_dict=1)
+
+
+@plan_check(task=SAMPLE_NAME)
+def get_task_users(task):
+    """Users a task belongs to in the task-assignee index"""
+    return frappe.db.sql(f"""
+        SELECT DISTINCT user
+        FROM `{TASK_ASSIGNEE_TABLE}`
+        WHERE task = %s
+    """, (task,), pluck=True)
+
+
+@plan_check(project=SAMPLE_NAME)
+def get_project_task_users(project):
+    """Users any task of a project belongs to in the task-assignee index"""
+    return frappe.db.sql(f"""
+        SELECT DISTINCT a.user
+        FROM `tabTask` t
+        JOIN `{TASK_ASSIGNEE_TABLE}` a ON a.task = t.name
+        WHERE t.project = %s
+    """, (project,), pluck=True)
+
+
+@plan_check(user=SAMPLE_NAME, exclude_task=SAMPLE_NAME)
+def get_tagged_open_tasks(user, exclude_task=None):
+    """Open tasks a user has run a timer on, other than the given one"""
+    return frappe.db.sql(f"""
+        SELECT t.name, t.subject
+        FROM `{TASK_ASSIGNEE_TABLE}` a
+        JOIN `tabTask` t ON t.name = a.task
+        WHERE a.user = %s
+        AND a.source = 'timer'
+        AND t.docstatus = 0
+        AND t.status != 'Completed'
+        AND t.name != %s
+    """, (user, exclude_task or ""), as_dict=1)
+
+
+@plan_check(user=SAMPLE_NAME, day=SAMPLE_DATE)
+def get_overdue_tasks_by_start_date(user, day):
+    """Unfinished tasks of a user whose expected start date has passed"""
+    return frappe.db.sql(f"""
+        SELECT
+            t.name,
+            t.subject,
+            t.status,
+            t.progress,
+            t.project,
+            p.project_name,
+            t.exp_start_date,
+            DATEDIFF(%s, t.exp_start_date) as days_overdue
+        FROM `tabTask` t
+        LEFT JOIN `tabProject` p ON t.project = p.name
+        WHERE t.name IN (
+            SELECT task FROM `{TASK_ASSIGNEE_TABLE}` WHERE user = %s
+        )
+        AND t.exp_start_date < %s
+        AND t.status != 'Completed'
+        ORDER BY t.exp_start_date ASC
+    """, (day, user, day), as_dict=1)
+
+
+@plan_check(user=SAMPLE_NAME, day=SAMPLE_DATE)
+def get_overdue_tasks_by_end_date(user, day):
+    """Open tasks assigned to a user whose expected end date has passed"""
+    return frappe.db.sql(f"""
+        SELECT
+            t.name,
+            t.subject,
+            t.project,
+            t.exp_end_date,
+            t.progress,
+            DATEDIFF(%s, t.exp_end_date) as days_overdue
+        FROM `{TASK_ASSIGNEE_TABLE}` a
+        JOIN `tabTask` t ON t.name = a.task
+        WHERE a.user = %s
+        AND a.source = 'assignment'
+        AND t.exp_end_date < %s
+        AND t.status NOT IN ('Completed', 'Cancelled')
+        ORDER BY t.exp_end_date ASC
+    """, (day, user, day), as_dict=1)
+
+
+@plan_check(user=SAMPLE_NAME)
+def get_startable_tasks(user):
+    """Unfinished tasks assigned to a user or timed by them, in pick order"""
+    return frappe.db.sql(f"""
+        SELECT
+            t.name,
+            t.subject,
+            t.status,
+            t.progress,
+            t.project,
+            p.project_name,
+            t.priority,
+            t.exp_start_date,
+            t.exp_end_date
+        FROM `tabTask` t
+        LEFT JOIN `tabProject` p ON t.project = p.name
+        WHERE t.name IN (
+            SELECT task FROM `{TASK_ASSIGNEE_TABLE}` WHERE user = %s
+        )
+        AND t.status != 'Completed'
+        ORDER BY
+            CASE t.priority
+                WHEN 'High' THEN 1
+                WHEN 'Medium' THEN 2
+                WHEN 'Low' THEN 3
+                ELSE 4
+            END,
+            t.exp_start_date ASC,
+            t.creation DESC
+    """, (user,), as_dict=1)
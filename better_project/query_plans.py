@@ -0,0 +1,139 @@
+"""EXPLAIN-based regression check for the app's SQL.
+
+Query functions register the arguments they are checked with through
+``queries.plan_check``, once per shape of statement their callers produce.
+Each registered function is called with ``frappe.db.sql`` replaced by one
+that EXPLAINs the statement with its bound values instead of running it. A
+statement fails when the plan reads one of ``HOT_TABLES`` with a full scan
+(``type = ALL``), or any other table with a full scan and no index even
+considered for it, which is what a missing or unusable index looks like
+regardless of how few rows the site has. A statement that cannot be
+explained fails too, and so does a public function of ``queries`` that is
+not registered, so a new query cannot go unchecked.
+
+Run it with ``bench --site <site> check-query-plans`` (non-zero exit status
+on a regression) or through ``better_project/tests/test_query_plans.py``.
+"""
+
+import importlib
+import inspect
+import re
+
+import frappe
+
+from better_project import queries
+
+# Modules whose query functions register plan checks
+SOURCES = (
+    "better_project.queries",
+    "better_project.time_rollup",
+    "better_project.task_assignees",
+)
+
+# Functions of ``queries`` that issue no SQL of their own
+UNCHECKED = {"day_range", "plan_check"}
+
+# Tables the timer reads on every call; a full scan of them always fails
+HOT_TABLES = {"tabTimesheet Detail", "tabTimesheet", "tabTask"}
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT")
+# `tabTimesheet Detail` td, `tabTask` AS t
+TABLE_ALIAS = re.compile(r"`(\w[\w ]*)`(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+ALIAS_KEYWORDS = {"ON", "WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "SET", "GROUP", "ORDER", "LIMIT", "USING"}
+
+
+def check_query_plans():
+    """Return one dict per statement whose plan falls back to a full table scan
+
+    A statement or function that cannot be checked is returned with its ``error``.
+    """
+    for module_name in SOURCES:
+        importlib.import_module(module_name)
+
+    problems = [
+        {"source": f"{queries.__name__}.{name}", "error": "no plan_check registered"}
+        for name in get_unregistered()
+    ]
+    for function, sample in queries.PLAN_CHECKS:
+        source = f"{function.__module__}.{function.__name__}"
+        for query, plan in explain_calls(function, sample):
+            if isinstance(plan, Exception):
+                # Report it and go on, so one bad statement cannot hide the rest
+                problems.append({"source": source, "error": str(plan)})
+                continue
+
+            tables = _table_aliases(query)
+            for row in plan:
+                table = str(row.get("table"))
+                if row.get("type") != "ALL" or table.startswith("<"):
+                    continue
+                if tables.get(table, table) in HOT_TABLES or not row.get("possible_keys"):
+                    problems.append({
+                        "source": source,
+                        "table": tables.get(table, table),
+                        "rows": row.get("rows")
+                    })
+    return problems
+
+
+def get_unregistered():
+    """Public functions of ``queries`` without a plan check"""
+    registered = {function for function, sample in queries.PLAN_CHECKS}
+    return [
+        name
+        for name, function in inspect.getmembers(queries, inspect.isfunction)
+        if function.__module__ == queries.__name__
+        and not name.startswith("_")
+        and name not in UNCHECKED
+        and function not in registered
+    ]
+
+
+def explain_calls(function, sample):
+    """(query, plan) of each statement a call issues; the plan is the exception if EXPLAIN failed
+
+    The statements are explained, not run, so the call sees no rows.
+    """
+    db = frappe.local.db
+    previous = db.__dict__.get("sql")
+    calls = []
+
+    def explain_sql(query, values=(), *args, **kwargs):
+        query = str(query)
+        if query.lstrip().upper().startswith(EXPLAINABLE):
+            try:
+                calls.append((query, explain(query, values)))
+            except Exception as e:
+                calls.append((query, e))
+        return ()
+
+    db.sql = explain_sql
+    try:
+        function(**sample)
+    except Exception as e:
+        # Code after a statement may expect rows; only a call that issued none is a failure
+        if not calls:
+            calls.append((function.__name__, e))
+    finally:
+        if previous is None:
+            del db.sql
+        else:
+            db.sql = previous
+    return calls
+
+
+def explain(query, values=()):
+    """EXPLAIN a statement with its values bound as frappe.db.sql binds them"""
+    db = frappe.local.db
+    # The class method skips any instance wrappers (request timing, slow query log)
+    return type(db).sql(db, "EXPLAIN " + query, values or (), as_dict=1)
+
+
+def _table_aliases(query):
+    """Map of alias (and table name) to table name for the tables of a statement"""
+    tables = {}
+    for table, alias in TABLE_ALIAS.findall(query):
+        tables[table] = table
+        if alias and alias.upper() not in ALIAS_KEYWORDS:
+            tables[alias] = table
+    return tables
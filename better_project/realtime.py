@@ -0,0 +1,66 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+"""Realtime delta events for the navbar timer.
+
+Timer writes publish small deltas instead of having every open tab poll.
+``better_project_timer`` goes to the acting user's room and carries what the
+user's own tabs need (today's tasks, charts). ``better_project_team_status``
+goes to the site room, which every desk session joins, and carries one row of
+the team status board. Both are sent only if the transaction commits.
+"""
+
+import frappe
+from frappe.utils import get_datetime
+
+TIMER_EVENT = "better_project_timer"
+TEAM_EVENT = "better_project_team_status"
+
+
+def publish_timer_started(employee, task, subject, project, from_time, stopped_tasks=None):
+    """Announce a newly started timer and the timers it closed"""
+    start_time = str(get_datetime(from_time))
+    user = frappe.session.user
+
+    frappe.publish_realtime(TIMER_EVENT, {
+        "action": "start",
+        "task": task,
+        "subject": subject,
+        "project": project,
+        "start_time": start_time,
+        "stopped": [{"task": t["task"], "hours": t.get("hours") or 0} for t in stopped_tasks or []]
+    }, user=user, after_commit=True)
+
+    employee_name = frappe.get_cached_value("Employee", employee, "employee_name")
+    frappe.publish_realtime(TEAM_EVENT, {
+        "action": "start",
+        "employee": employee,
+        "employee_name": employee_name,
+        "user_image": frappe.get_cached_value("User", user, "user_image"),
+        "task_name": task,
+        "task_subject": subject,
+        "start_time": start_time
+    }, after_commit=True)
+
+
+def publish_timer_stopped(employee, task, hours):
+    """Announce a closed timer"""
+    frappe.publish_realtime(TIMER_EVENT, {
+        "action": "stop",
+        "task": task,
+        "hours": hours or 0
+    }, user=frappe.session.user, after_commit=True)
+
+    frappe.publish_realtime(TEAM_EVENT, {
+        "action": "stop",
+        "employee": employee,
+        "task_name": task
+    }, after_commit=True)
+
+
+def publish_task_completed(task):
+    """Announce a completed task to the user's own tabs"""
+    frappe.publish_realtime(TIMER_EVENT, {
+        "action": "complete",
+        "task": task
+    }, user=frappe.session.user, after_commit=True)
@@ -0,0 +1,63 @@
+"""Coalesced background recompute of timesheet amounts.
+
+The timer paths write time logs with direct UPDATEs. Hours are kept up to
+date in the same transaction (see ``time_totals``), but the billing and
+costing amounts depend on activity rates and are not refreshed on the request
+path. Instead the timesheets that need a refresh are added to a Redis set and
+a single deduplicated background job drains it: however many stops touch a
+timesheet before the job runs, it is recomputed once. The scheduler also
+drains the set, which picks up keys added while a running job was finishing.
+"""
+
+import frappe
+
+PENDING_KEY = "better_project:recompute:pending"
+JOB_ID = "better_project:recompute"
+
+
+def schedule_timesheet(timesheet):
+    """Recompute the totals of a draft Timesheet in the background"""
+    if not timesheet:
+        return
+
+    def _enqueue():
+        frappe.cache().sadd(PENDING_KEY, timesheet)
+        frappe.enqueue(
+            "better_project.recompute.process_pending",
+            queue="short",
+            job_id=JOB_ID,
+            deduplicate=True
+        )
+
+    # The job must see the committed time logs
+    frappe.db.after_commit.add(_enqueue)
+
+
+def process_pending():
+    """Recompute every pending timesheet; runs as the background job and from the scheduler"""
+    while True:
+        timesheet = frappe.cache().spop(PENDING_KEY)
+        if not timesheet:
+            break
+        if isinstance(timesheet, bytes):
+            timesheet = timesheet.decode()
+        try:
+            recompute_timesheet(timesheet)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(f"Error recomputing Timesheet {timesheet}")
+
+
+def recompute_timesheet(timesheet):
+    """Recompute the hour and amount totals of a draft Timesheet and its time logs"""
+    if frappe.db.get_value("Timesheet", timesheet, "docstatus") != 0:
+        return
+
+    doc = frappe.get_doc("Timesheet", timesheet)
+    doc.calculate_total_amounts()
+    doc.calculate_percentage_billed()
+    for log in doc.time_logs:
+        log.db_update()
+    doc.db_update()
+
@@ -0,0 +1,159 @@
+"""Per-request SQL and time accounting for the app's endpoints.
+
+For requests to a ``better_project.*`` method, ``before_request`` wraps the
+request's ``frappe.db.sql`` and ``frappe.db.commit`` to count queries, their
+time and commits. ``after_request`` restores them and reports the totals:
+
+* as a ``Server-Timing`` header (``db``, ``app`` for the Python time outside
+  SQL, ``total``), which the browser's network panel shows per call;
+* added to hourly per-endpoint counters in Redis that expire after
+  ``RETENTION_HOURS``, read back by ``get_stats`` and
+  ``bench --site <site> endpoint-timings``.
+
+Set ``better_project_request_timing: 0`` in site_config to turn it off.
+"""
+
+import re
+import time
+
+import frappe
+from frappe.utils import add_to_date, flt, now_datetime
+
+METHOD_PATH = re.compile(r"^/api/(?:v\d+/)?method/(better_project\.[\w.]+)")
+ENDPOINTS_KEY = "better_project:request_timing:endpoints"
+BUCKET_KEY = "better_project:request_timing:{0}:{1}"
+RETENTION_HOURS = 48
+
+COUNTERS = ("calls", "queries", "commits")
+DURATIONS = ("db_ms", "app_ms", "total_ms")
+
+
+def before_request():
+    """Start timing if the request calls one of the app's methods"""
+    if not frappe.conf.get("better_project_request_timing", 1) or not frappe.request:
+        return
+    match = METHOD_PATH.match(frappe.request.path or "")
+    if not match:
+        return
+
+    timing = frappe._dict(
+        method=match.group(1),
+        started=time.perf_counter(),
+        queries=0,
+        commits=0,
+        db_ms=0.0
+    )
+    frappe.local.better_project_timing = timing
+
+    sql = frappe.db.sql
+    commit = frappe.db.commit
+
+    def timed_sql(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return sql(*args, **kwargs)
+        finally:
+            timing.queries += 1
+            timing.db_ms += (time.perf_counter() - started) * 1000
+
+    def counted_commit(*args, **kwargs):
+        timing.commits += 1
+        return commit(*args, **kwargs)
+
+    frappe.db.sql = timed_sql
+    frappe.db.commit = counted_commit
+
+
+def after_request(response=None, request=None):
+    """Stop timing, add the Server-Timing header and the endpoint counters"""
+    timing = getattr(frappe.local, "better_project_timing", None)
+    if not timing:
+        return
+    frappe.local.better_project_timing = None
+
+    total_ms = (time.perf_counter() - timing.started) * 1000
+    if frappe.db:
+        # Drop the instance wrappers so the class methods are used again
+        for name in ("sql", "commit"):
+            try:
+                delattr(frappe.db, name)
+            except AttributeError:
+                pass
+
+    app_ms = max(total_ms - timing.db_ms, 0)
+    if response is not None:
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={timing.db_ms:.1f};desc="{timing.queries} queries, {timing.commits} commits", '
+            f"app;dur={app_ms:.1f}, total;dur={total_ms:.1f}"
+        )
+
+    try:
+        _record(timing.method, {
+            "calls": 1,
+            "queries": timing.queries,
+            "commits": timing.commits,
+            "db_ms": timing.db_ms,
+            "app_ms": app_ms,
+            "total_ms": total_ms
+        })
+    except Exception:
+        # Accounting must never fail a request
+        pass
+
+
+def get_stats(hours=24):
+    """Totals and per-call averages of each endpoint over the last hours, costliest first"""
+    # The counters are plain Redis values, so they are read with raw commands
+    # through a pipeline rather than the pickling cache helpers
+    cache = frappe.cache()
+    pipeline = cache.pipeline()
+    pipeline.smembers(cache.make_key(ENDPOINTS_KEY))
+    methods = sorted(_decode(member) for member in pipeline.execute()[0])
+
+    buckets = [_bucket(hour) for hour in range(hours)]
+    stats = []
+    for method in methods:
+        pipeline = cache.pipeline()
+        for bucket in buckets:
+            pipeline.hgetall(cache.make_key(BUCKET_KEY.format(method, bucket)))
+
+        totals = dict.fromkeys(COUNTERS + DURATIONS, 0.0)
+        for values in pipeline.execute():
+            for field, value in values.items():
+                field = _decode(field)
+                if field in totals:
+                    totals[field] += flt(_decode(value))
+        if not totals["calls"]:
+            continue
+        calls = totals["calls"]
+        stats.append(frappe._dict(
+            method=method,
+            calls=int(calls),
+            **{field: round(totals[field], 1) for field in COUNTERS[1:] + DURATIONS},
+            avg_queries=round(totals["queries"] / calls, 1),
+            avg_db_ms=round(totals["db_ms"] / calls, 1),
+            avg_total_ms=round(totals["total_ms"] / calls, 1)
+        ))
+    return sorted(stats, key=lambda row: row.total_ms, reverse=True)
+
+
+def _record(method, values):
+    cache = frappe.cache()
+    key = cache.make_key(BUCKET_KEY.format(method, _bucket()))
+    pipeline = cache.pipeline()
+    pipeline.sadd(cache.make_key(ENDPOINTS_KEY), method)
+    for field in COUNTERS:
+        pipeline.hincrby(key, field, values[field])
+    for field in DURATIONS:
+        pipeline.hincrbyfloat(key, field, round(values[field], 3))
+    pipeline.expire(key, RETENTION_HOURS * 3600)
+    pipeline.execute()
+
+
+def _bucket(hours_ago=0):
+    return add_to_date(now_datetime(), hours=-hours_ago).strftime("%Y%m%d%H")
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,154 @@
+"""Opt-in log of slow SQL issued from better_project code.
+
+With ``better_project_slow_query_ms`` set in site_config, every request and
+background job wraps its ``frappe.db.sql``. A statement that takes at least
+that many milliseconds and was called from a ``better_project`` module is
+recorded with its bound values, its call site (module, function and line),
+its time and, for SELECT/UPDATE/DELETE, the ``EXPLAIN`` of it. Entries go to
+a Redis list capped at ``LOG_SIZE`` (newest first), so the log never grows.
+``get_report`` groups them by call site; see
+``bench --site <site> slow-queries``.
+"""
+
+import json
+import sys
+import time
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+from better_project.query_plans import EXPLAINABLE
+
+LOG_KEY = "better_project:slow_queries"
+LOG_SIZE = 500
+MAX_TEXT = 4000
+
+# Wrappers whose frames are not the call site
+IGNORED_MODULES = {__name__, "better_project.request_timing"}
+
+
+def get_threshold_ms():
+    """Capture threshold from site_config; 0 means capture is off"""
+    return cint(frappe.conf.get("better_project_slow_query_ms"))
+
+
+def install():
+    """Wrap frappe.db.sql of the current request or job if capture is on"""
+    threshold = get_threshold_ms()
+    if not threshold or not frappe.db or getattr(frappe.local, "better_project_slow_queries", False):
+        return
+    frappe.local.better_project_slow_queries = True
+
+    sql = frappe.db.sql
+
+    def captured_sql(query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return sql(query, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms >= threshold:
+                _capture(query, args[0] if args else kwargs.get("values"), elapsed_ms)
+
+    frappe.db.sql = captured_sql
+
+
+def uninstall(*args, **kwargs):
+    """Remove the wrapper at the end of the request or job"""
+    if not getattr(frappe.local, "better_project_slow_queries", False):
+        return
+    frappe.local.better_project_slow_queries = False
+    if frappe.db:
+        try:
+            delattr(frappe.db, "sql")
+        except AttributeError:
+            # request_timing has already dropped the wrappers
+            pass
+
+
+def get_entries():
+    """Captured statements, newest first"""
+    return [json.loads(entry) for entry in frappe.cache().lrange(LOG_KEY, 0, -1) or []]
+
+
+def get_report():
+    """Captured statements grouped by call site, most total time first
+
+    Each group has the count, total, average and maximum time and the latest
+    statement, values and plan.
+    """
+    groups = {}
+    for entry in get_entries():
+        group = groups.get(entry["caller"])
+        if not group:
+            # Entries are newest first, so the first one seen is the latest
+            group = groups[entry["caller"]] = frappe._dict(
+                caller=entry["caller"],
+                count=0,
+                total_ms=0,
+                max_ms=0,
+                last_at=entry["at"],
+                query=entry["query"],
+                values=entry["values"],
+                plan=entry["plan"]
+            )
+        group.count += 1
+        group.total_ms += entry["ms"]
+        group.max_ms = max(group.max_ms, entry["ms"])
+
+    for group in groups.values():
+        group.total_ms = round(group.total_ms, 1)
+        group.avg_ms = round(group.total_ms / group.count, 1)
+    return sorted(groups.values(), key=lambda group: group.total_ms, reverse=True)
+
+
+def clear():
+    frappe.cache().delete_value(LOG_KEY)
+
+
+def _capture(query, values, elapsed_ms):
+    caller = _find_caller()
+    if not caller:
+        return
+    try:
+        query = str(query)
+        entry = {
+            "at": str(now_datetime()),
+            "caller": caller,
+            "ms": round(elapsed_ms, 1),
+            "query": query[:MAX_TEXT],
+            "values": repr(values)[:MAX_TEXT],
+            "plan": _explain(query, values)
+        }
+        cache = frappe.cache()
+        cache.lpush(LOG_KEY, json.dumps(entry, default=str))
+        cache.ltrim(LOG_KEY, 0, LOG_SIZE - 1)
+    except Exception:
+        # Capturing must never fail the statement's caller
+        pass
+
+
+def _find_caller():
+    frame = sys._getframe(2)
+    while frame:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("better_project") and module not in IGNORED_MODULES:
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+def _explain(query, values):
+    if not query.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        # The class method skips the wrappers, so the EXPLAIN is neither
+        # captured nor counted by request_timing
+        db = frappe.local.db
+        rows = type(db).sql(db, "EXPLAIN " + query, values or (), as_dict=1)
+    except Exception as e:
+        return str(e)
+    return [
+        {key: row.get(key) for key in ("table", "type", "possible_keys", "key", "rows", "Extra")}
+        for row in rows
+    ]
@@ -0,0 +1,117 @@
+"""Task-assignee index.
+
+One row per (user, task, source) for every user a task belongs to, where
+``source`` is ``assignment`` for an open ToDo assignment and ``timer`` for a
+user who has run a timer on the task. It replaces the leading-wildcard
+``LIKE`` scans over ``_user_tags`` and ``_assign``: the primary key serves
+"tasks of a user" lookups and the ``task`` key serves cleanup. ToDo doc
+events and the timer endpoints keep it in sync, and
+``bench rebuild-task-assignees`` recomputes it from scratch.
+"""
+
+import frappe
+
+from better_project import navbar_versions, queries
+
+TABLE = queries.TASK_ASSIGNEE_TABLE
+
+ASSIGNMENT = "assignment"
+TIMER = "timer"
+
+
+def ensure_table():
+    """Create the index table if it does not exist yet"""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE}` (
+            `user` varchar(140) NOT NULL,
+            `task` varchar(140) NOT NULL,
+            `source` varchar(20) NOT NULL,
+            PRIMARY KEY (`user`, `task`, `source`),
+            KEY `task` (`task`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+@queries.plan_check(task=queries.SAMPLE_NAME, user=queries.SAMPLE_NAME, source=ASSIGNMENT)
+def add(task, user, source):
+    """Record that a task belongs to a user"""
+    if not (task and user):
+        return
+    frappe.db.sql(f"""
+        INSERT IGNORE INTO `{TABLE}` (user, task, source)
+        VALUES (%s, %s, %s)
+    """, (user, task, source))
+    navbar_versions.bump(navbar_versions.user_scope(user))
+
+
+@queries.plan_check(task=queries.SAMPLE_NAME)
+@queries.plan_check(task=queries.SAMPLE_NAME, user=queries.SAMPLE_NAME, source=ASSIGNMENT)
+def remove(task, user=None, source=None):
+    """Drop the rows of a task, optionally only for one user and source"""
+    conditions = ["task = %(task)s"]
+    if user:
+        conditions.append("user = %(user)s")
+    if source:
+        conditions.append("source = %(source)s")
+    frappe.db.sql(f"""
+        DELETE FROM `{TABLE}`
+        WHERE {" AND ".join(conditions)}
+    """, {"task": task, "user": user, "source": source})
+    if user:
+        navbar_versions.bump(navbar_versions.user_scope(user))
+
+
+def sync_assignment(task, user):
+    """Add or drop the assignment row of a user from their open ToDos on the task"""
+    if not (task and user):
+        return
+    if frappe.db.exists("ToDo", {
+        "reference_type": "Task",
+        "reference_name": task,
+        "allocated_to": user,
+        "status": "Open"
+    }):
+        add(task, user, ASSIGNMENT)
+    else:
+        remove(task, user, ASSIGNMENT)
+
+
+def rebuild():
+    """Recompute the whole index from open ToDos and logged time"""
+    frappe.db.sql(f"DELETE FROM `{TABLE}`")
+    frappe.db.sql(f"""
+        INSERT IGNORE INTO `{TABLE}` (user, task, source)
+        SELECT DISTINCT allocated_to, reference_name, %s
+        FROM `tabToDo`
+        WHERE reference_type = 'Task'
+        AND status = 'Open'
+        AND allocated_to IS NOT NULL
+        AND reference_name IS NOT NULL
+    """, (ASSIGNMENT,))
+    frappe.db.sql(f"""
+        INSERT IGNORE INTO `{TABLE}` (user, task, source)
+        SELECT DISTINCT emp.user_id, td.task, %s
+        FROM `tabTimesheet Detail` td
+        JOIN `tabTimesheet` ts ON ts.name = td.parent
+        JOIN `tabEmployee` emp ON emp.name = ts.employee
+        WHERE td.task IS NOT NULL
+        AND emp.user_id IS NOT NULL
+        AND ts.docstatus < 2
+    """, (TIMER,))
+
+
+def on_todo_change(doc, method=None):
+    """ToDo doc event: keep the assignment rows of the referenced task in sync"""
+    docs = [doc]
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    if before:
+        docs.append(before)
+
+    for todo in docs:
+        if todo.reference_type == "Task":
+            sync_assignment(todo.reference_name, todo.allocated_to)
+
+
+def on_task_delete(doc, method=None):
+    """Task doc event: drop every row of a deleted task"""
+    remove(doc.name)
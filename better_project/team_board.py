@@ -0,0 +1,71 @@
+"""Team status board snapshot.
+
+The board (who is working on what right now) is the same for every user, so
+it is built with one query and kept in the Redis cache. Every timer change
+drops the snapshot once its transaction commits (see
+``timer_registry.invalidate``) and the TTL bounds how stale it can get
+otherwise. Pages are cut from the snapshot, and its ``version`` (a hash of
+the rows) lets clients skip a response they already have.
+"""
+
+import hashlib
+import json
+
+import frappe
+from frappe.utils import cint
+
+from better_project import queries
+
+SNAPSHOT_KEY = "better_project:team_board"
+SNAPSHOT_TTL = 60
+PAGE_LENGTH = 20
+
+
+def get_snapshot():
+    """All open timers on the board and their version"""
+    snapshot = frappe.cache().get_value(SNAPSHOT_KEY)
+    if snapshot is None:
+        rows = [
+            {**row, "start_time": str(row.start_time)}
+            for row in queries.get_team_open_timers()
+        ]
+        snapshot = {"version": _version(rows), "rows": rows}
+        frappe.cache().set_value(SNAPSHOT_KEY, snapshot, expires_in_sec=SNAPSHOT_TTL)
+    return snapshot
+
+
+def get_page(page=1, page_length=PAGE_LENGTH, department=None, project=None, version=None):
+    """One page of the board, optionally filtered by department and project
+
+    Returns only ``version`` and ``not_modified`` when the client already has
+    the current version.
+    """
+    snapshot = get_snapshot()
+    if version and version == snapshot["version"]:
+        return {"version": snapshot["version"], "not_modified": True}
+
+    rows = [
+        frappe._dict(row) for row in snapshot["rows"]
+        if (not department or row.get("department") == department)
+        and (not project or row.get("project") == project)
+    ]
+    page = max(cint(page), 1)
+    page_length = max(cint(page_length), 1)
+    start = (page - 1) * page_length
+
+    return {
+        "version": snapshot["version"],
+        "total": len(rows),
+        "page": page,
+        "page_length": page_length,
+        "rows": rows[start:start + page_length]
+    }
+
+
+def invalidate():
+    """Drop the snapshot once the current transaction commits"""
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(SNAPSHOT_KEY))
+
+
+def _version(rows):
+    return hashlib.md5(json.dumps(rows, sort_keys=True, default=str).encode()).hexdigest()[:12]
@@ -0,0 +1,25 @@
+"""Every registered query keeps an index-backed plan."""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from better_project import query_plans
+
+
+class TestQueryPlans(FrappeTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_queries_are_registered(self):
+        self.assertEqual(query_plans.get_unregistered(), [])
+
+    def test_no_full_table_scans(self):
+        problems = query_plans.check_query_plans()
+        self.assertEqual(
+            problems,
+            [],
+            "\n".join(
+                f"{problem['source']}: {problem.get('error') or 'full scan of ' + problem['table']}"
+                for problem in problems
+            )
+        )
@@ -0,0 +1,176 @@
+"""Delta-maintained timesheet hours, reconciliation and Task.actual_time."""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, flt, get_datetime, getdate, now_datetime
+
+from better_project import time_totals, timers
+
+COMPANY = "_Test Company"
+
+
+class TestTimeTotals(FrappeTestCase):
+    def setUp(self):
+        self.employee = _make_employee("time-totals@example.com")
+        project = frappe.get_doc({
+            "doctype": "Project",
+            "project_name": "_Test Time Totals Project",
+            "company": COMPANY
+        }).insert()
+        self.task = frappe.get_doc({
+            "doctype": "Task",
+            "subject": "_Test Time Totals Task",
+            "project": project.name
+        }).insert()
+
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_closing_timers_adds_their_hours_to_the_timesheet(self):
+        start = get_datetime(f"{getdate()} 08:00:00")
+        timesheet = _make_timesheet(self.employee, self.task, 2, start)
+        timesheet.append("time_logs", {
+            "activity_type": _activity_type(),
+            "task": self.task.name,
+            "project": self.task.project,
+            "from_time": add_to_date(start, hours=2),
+            "to_time": None,
+            "hours": 0
+        })
+        timesheet.save()
+        self.assertTimesheetTotalMatchesLogs(timesheet.name, 2)
+
+        closed = timers.close_open_timers(employee=self.employee, to_time=add_to_date(start, hours=3.5))
+
+        self.assertEqual([log.timesheet for log in closed], [timesheet.name])
+        self.assertAlmostEqual(flt(closed[0].hours), 1.5, places=3)
+        self.assertTimesheetTotalMatchesLogs(timesheet.name, 3.5)
+        # Nothing left to close
+        self.assertEqual(timers.close_open_timers(employee=self.employee), [])
+        self.assertTimesheetTotalMatchesLogs(timesheet.name, 3.5)
+
+    def test_add_timesheet_hours(self):
+        timesheet = _make_timesheet(self.employee, self.task, 2)
+
+        time_totals.add_timesheet_hours(timesheet.name, 1.25)
+        self.assertAlmostEqual(flt(frappe.db.get_value("Timesheet", timesheet.name, "total_hours")), 3.25, places=3)
+
+        time_totals.add_timesheet_hours(timesheet.name, -1.25)
+        self.assertTimesheetTotalMatchesLogs(timesheet.name, 2)
+
+        # No timesheet or no hours is a no-op
+        time_totals.add_timesheet_hours(None, 5)
+        time_totals.add_timesheet_hours(timesheet.name, 0)
+        self.assertTimesheetTotalMatchesLogs(timesheet.name, 2)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        start = get_datetime(f"{getdate()} 08:00:00")
+        submitted = _make_timesheet(self.employee, self.task, 2, start)
+        submitted.submit()
+        draft = _make_timesheet(self.employee, self.task, 1, add_to_date(start, hours=3))
+        frappe.db.set_value("Task", self.task.name, "actual_time", 7, update_modified=False)
+        frappe.db.set_value("Timesheet", draft.name, "total_hours", 4, update_modified=False)
+
+        drift = {(row.doctype, row.name): row for row in time_totals.reconcile()}
+        self.assertEqual(
+            (drift[("Task", self.task.name)].stored, drift[("Task", self.task.name)].logged),
+            (7, 2)
+        )
+        self.assertEqual(
+            (drift[("Timesheet", draft.name)].stored, drift[("Timesheet", draft.name)].logged),
+            (4, 1)
+        )
+        self.assertNotIn(("Timesheet", submitted.name), drift)
+        # Without fix nothing is changed
+        self.assertEqual(flt(frappe.db.get_value("Task", self.task.name, "actual_time")), 7)
+
+        time_totals.reconcile(fix=True)
+
+        self.assertAlmostEqual(flt(frappe.db.get_value("Task", self.task.name, "actual_time")), 2, places=3)
+        self.assertTimesheetTotalMatchesLogs(draft.name, 1)
+        drift = {(row.doctype, row.name) for row in time_totals.reconcile()}
+        self.assertNotIn(("Task", self.task.name), drift)
+        self.assertNotIn(("Timesheet", draft.name), drift)
+
+    def test_actual_time_follows_submitted_timesheets(self):
+        # Timesheets of one employee must not overlap
+        start = get_datetime(f"{getdate()} 08:00:00")
+        first = _make_timesheet(self.employee, self.task, 2, start)
+        second = _make_timesheet(self.employee, self.task, 3, add_to_date(start, hours=3))
+
+        first.submit()
+        self.assertActualTimeMatchesSubmittedHours(2)
+
+        second.submit()
+        self.assertActualTimeMatchesSubmittedHours(5)
+
+        first.cancel()
+        self.assertActualTimeMatchesSubmittedHours(3)
+
+        second.cancel()
+        self.assertActualTimeMatchesSubmittedHours(0)
+
+    def assertTimesheetTotalMatchesLogs(self, timesheet, expected):
+        logged = frappe.db.sql("""
+            SELECT IFNULL(SUM(hours), 0)
+            FROM `tabTimesheet Detail`
+            WHERE parent = %s
+        """, (timesheet,))[0][0]
+        total_hours = frappe.db.get_value("Timesheet", timesheet, "total_hours")
+
+        self.assertAlmostEqual(flt(logged), expected, places=3)
+        self.assertAlmostEqual(flt(total_hours), flt(logged), places=3)
+
+    def assertActualTimeMatchesSubmittedHours(self, expected):
+        submitted = frappe.db.sql("""
+            SELECT IFNULL(SUM(td.hours), 0)
+            FROM `tabTimesheet Detail` td
+            JOIN `tabTimesheet` ts ON ts.name = td.parent
+            WHERE ts.docstatus = 1
+            AND td.task = %s
+        """, (self.task.name,))[0][0]
+        actual_time = frappe.db.get_value("Task", self.task.name, "actual_time")
+
+        self.assertAlmostEqual(flt(submitted), expected, places=3)
+        self.assertAlmostEqual(flt(actual_time), flt(submitted), places=3)
+
+
+def _make_employee(user):
+    if not frappe.db.exists("User", user):
+        frappe.get_doc({"doctype": "User", "email": user, "first_name": "Time Totals"}).insert()
+    employee = frappe.db.get_value("Employee", {"user_id": user})
+    if employee:
+        return employee
+    return frappe.get_doc({
+        "doctype": "Employee",
+        "first_name": "Time Totals",
+        "user_id": user,
+        "company": COMPANY,
+        "gender": "Male",
+        "date_of_birth": "1990-01-01",
+        "date_of_joining": "2020-01-01"
+    }).insert().name
+
+
+def _make_timesheet(employee, task, hours, from_time=None):
+    from_time = get_datetime(from_time or now_datetime())
+    return frappe.get_doc({
+        "doctype": "Timesheet",
+        "employee": employee,
+        "company": COMPANY,
+        "time_logs": [{
+            "activity_type": _activity_type(),
+            "task": task.name,
+            "project": task.project,
+            "from_time": from_time,
+            "to_time": add_to_date(from_time, hours=hours),
+            "hours": hours
+        }]
+    }).insert()
+
+
+def _activity_type():
+    name = "_Test Time Totals Activity"
+    if not frappe.db.exists("Activity Type", name):
+        frappe.get_doc({"doctype": "Activity Type", "activity_type": name}).insert()
+    return name
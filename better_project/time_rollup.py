@@ -0,0 +1,132 @@
+"""Daily time rollup.
+
+One row per (employee, work_date, project, task) with the hours and number of
+closed time logs, kept separately for all non-cancelled timesheets and for
+submitted ones only. Closing a time log adds to its row in the same
+transaction. Timesheet doc events recompute the rows of the days they touch,
+and ``bench rebuild-time-rollup`` recomputes everything from
+``tabTimesheet Detail``.
+"""
+
+import frappe
+from frappe.utils import get_datetime, getdate
+
+from better_project import queries
+
+TABLE = queries.TIME_ROLLUP_TABLE
+
+
+def ensure_table():
+    """Create the rollup table if it does not exist yet"""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE}` (
+            `employee` varchar(140) NOT NULL,
+            `work_date` date NOT NULL,
+            `project` varchar(140) NOT NULL DEFAULT '',
+            `task` varchar(140) NOT NULL DEFAULT '',
+            `hours` decimal(21,9) NOT NULL DEFAULT 0,
+            `log_count` int(11) NOT NULL DEFAULT 0,
+            `submitted_hours` decimal(21,9) NOT NULL DEFAULT 0,
+            `submitted_log_count` int(11) NOT NULL DEFAULT 0,
+            `last_from_time` datetime(6) DEFAULT NULL,
+            `last_to_time` datetime(6) DEFAULT NULL,
+            PRIMARY KEY (`employee`, `work_date`, `project`, `task`),
+            KEY `task_work_date` (`task`, `work_date`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+@queries.plan_check(
+    employee=queries.SAMPLE_NAME, task=queries.SAMPLE_NAME, project=queries.SAMPLE_NAME,
+    from_time=queries.SAMPLE_DATETIME, to_time=queries.SAMPLE_DATETIME, hours=1
+)
+def add_time_log(employee, task, project, from_time, to_time, hours, submitted=False):
+    """Add one closed time log to its rollup row"""
+    from_time = get_datetime(from_time)
+    submitted = 1 if submitted else 0
+    frappe.db.sql(f"""
+        INSERT INTO `{TABLE}`
+            (employee, work_date, project, task, hours, log_count,
+            submitted_hours, submitted_log_count, last_from_time, last_to_time)
+        VALUES (%(employee)s, %(work_date)s, %(project)s, %(task)s, %(hours)s, 1,
+            %(submitted_hours)s, %(submitted)s, %(from_time)s, %(to_time)s)
+        ON DUPLICATE KEY UPDATE
+            hours = hours + VALUES(hours),
+            log_count = log_count + 1,
+            submitted_hours = submitted_hours + VALUES(submitted_hours),
+            submitted_log_count = submitted_log_count + VALUES(submitted_log_count),
+            last_from_time = GREATEST(IFNULL(last_from_time, VALUES(last_from_time)), VALUES(last_from_time)),
+            last_to_time = GREATEST(IFNULL(last_to_time, VALUES(last_to_time)), VALUES(last_to_time))
+    """, {
+        "employee": employee,
+        "work_date": from_time.date(),
+        "project": project or "",
+        "task": task or "",
+        "hours": hours or 0,
+        "submitted_hours": (hours or 0) if submitted else 0,
+        "submitted": submitted,
+        "from_time": from_time,
+        "to_time": get_datetime(to_time)
+    })
+
+
+@queries.plan_check(employee=queries.SAMPLE_NAME, from_date=queries.SAMPLE_DATE, to_date=queries.SAMPLE_DATE)
+def rebuild(employee=None, from_date=None, to_date=None):
+    """Recompute rollup rows from the time logs, optionally for one employee and date range"""
+    conditions = []
+    values = {}
+    if employee:
+        conditions.append("employee = %(employee)s")
+        values["employee"] = employee
+    if from_date:
+        conditions.append("work_date >= %(from_date)s")
+        values["from_date"] = getdate(from_date)
+    if to_date:
+        conditions.append("work_date <= %(to_date)s")
+        values["to_date"] = getdate(to_date)
+
+    where = " AND ".join(conditions) or "1=1"
+    frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE {where}", values)
+
+    source_conditions = ["td.to_time IS NOT NULL", "ts.docstatus < 2"]
+    if employee:
+        source_conditions.append("ts.employee = %(employee)s")
+    if from_date:
+        source_conditions.append("td.from_time >= %(from_time)s")
+        values["from_time"] = queries.day_range(from_date)[0]
+    if to_date:
+        source_conditions.append("td.from_time < %(to_time)s")
+        values["to_time"] = queries.day_range(to_date)[1]
+
+    frappe.db.sql(f"""
+        INSERT INTO `{TABLE}`
+            (employee, work_date, project, task, hours, log_count,
+            submitted_hours, submitted_log_count, last_from_time, last_to_time)
+        SELECT
+            ts.employee,
+            DATE(td.from_time),
+            IFNULL(td.project, ''),
+            IFNULL(td.task, ''),
+            SUM(td.hours),
+            COUNT(*),
+            SUM(IF(ts.docstatus = 1, td.hours, 0)),
+            SUM(IF(ts.docstatus = 1, 1, 0)),
+            MAX(td.from_time),
+            MAX(td.to_time)
+        FROM `tabTimesheet Detail` td
+        JOIN `tabTimesheet` ts ON ts.name = td.parent
+        WHERE {" AND ".join(source_conditions)}
+        GROUP BY ts.employee, DATE(td.from_time), IFNULL(td.project, ''), IFNULL(td.task, '')
+    """, values)
+
+
+def on_timesheet_change(doc, method=None):
+    """Timesheet doc event: recompute the days touched by the timesheet"""
+    logs = list(doc.get("time_logs", []))
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    if before:
+        logs.extend(before.get("time_logs", []))
+
+    dates = [getdate(log.from_time) for log in logs if log.from_time]
+    if doc.employee and dates:
+        rebuild(doc.employee, min(dates), max(dates))
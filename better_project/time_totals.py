@@ -0,0 +1,86 @@
+"""Incrementally maintained time totals.
+
+Closing a time log adds its hours to its timesheet's ``total_hours`` in the
+same transaction, instead of re-summing the timesheet. ``Task.actual_time``
+counts submitted hours only and is recomputed by ERPNext itself when a
+timesheet is submitted or cancelled (``update_task_and_project``), and desk
+edits of a draft timesheet recompute its totals in ERPNext's own validation.
+``reconcile`` compares the stored totals with ``tabTimesheet Detail`` daily
+and reports any drift; run ``bench reconcile-time-totals --fix`` to correct
+it.
+"""
+
+import frappe
+from frappe.utils import flt
+
+# Differences below this many hours are rounding, not drift
+TOLERANCE = 0.001
+
+
+def add_timesheet_hours(timesheet, hours):
+    """Add hours to the total of a timesheet"""
+    if not (timesheet and hours):
+        return
+    frappe.db.sql("""
+        UPDATE `tabTimesheet`
+        SET total_hours = IFNULL(total_hours, 0) + %s
+        WHERE name = %s
+    """, (hours, timesheet))
+
+
+def reconcile(fix=False):
+    """Compare stored totals with the time logs and return the rows that drifted
+
+    With ``fix`` the drifted totals are overwritten with the logged hours.
+    """
+    drift = [
+        frappe._dict(doctype="Task", name=row.name, stored=flt(row.stored), logged=flt(row.logged))
+        for row in _task_drift()
+    ] + [
+        frappe._dict(doctype="Timesheet", name=row.name, stored=flt(row.stored), logged=flt(row.logged))
+        for row in _timesheet_drift()
+    ]
+
+    if fix:
+        for row in drift:
+            field = "actual_time" if row.doctype == "Task" else "total_hours"
+            frappe.db.set_value(row.doctype, row.name, field, row.logged, update_modified=False)
+
+    return drift
+
+
+def reconcile_daily():
+    """Scheduler job: log any drift between stored totals and the time logs"""
+    drift = reconcile()
+    if drift:
+        frappe.log_error(
+            "Time total drift",
+            "\n".join(f"{row.doctype} {row.name}: stored {row.stored}, logged {row.logged}" for row in drift)
+        )
+
+
+def _task_drift():
+    return frappe.db.sql("""
+        SELECT t.name, t.actual_time as stored, IFNULL(logged.hours, 0) as logged
+        FROM `tabTask` t
+        LEFT JOIN (
+            SELECT td.task, SUM(td.hours) as hours
+            FROM `tabTimesheet Detail` td
+            JOIN `tabTimesheet` ts ON ts.name = td.parent
+            WHERE ts.docstatus = 1
+            AND td.task IS NOT NULL
+            GROUP BY td.task
+        ) logged ON logged.task = t.name
+        WHERE ABS(IFNULL(t.actual_time, 0) - IFNULL(logged.hours, 0)) > %s
+    """, (TOLERANCE,), as_dict=1)
+
+
+def _timesheet_drift():
+    return frappe.db.sql("""
+        SELECT ts.name, ts.total_hours as stored, IFNULL(SUM(td.hours), 0) as logged
+        FROM `tabTimesheet` ts
+        LEFT JOIN `tabTimesheet Detail` td ON td.parent = ts.name
+        WHERE ts.docstatus < 2
+        GROUP BY ts.name, ts.total_hours
+        HAVING ABS(IFNULL(stored, 0) - logged) > %s
+    """, (TOLERANCE,), as_dict=1)
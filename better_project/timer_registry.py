@@ -0,0 +1,105 @@
+# Copyright (c) 2024, Sepehr Sariaslani and Contributors
+# License: MIT. See LICENSE
+
+"""Active-timer registry kept in the Redis cache.
+
+Open time logs (``to_time IS NULL`` on a draft Timesheet) are indexed twice,
+once per employee and once per task. A key is filled from the database the
+first time it is read, and every code path that opens or closes a time log
+drops the keys it touched, and the team board snapshot, once its transaction
+commits. Each fill is stamped with the key's generation (see
+``generations``), so a reader that loaded the open logs before a commit
+cannot put them back after the commit dropped them.
+"""
+
+import frappe
+from frappe.utils import get_datetime
+
+from better_project import employee_context, generations, navbar_versions, queries, team_board
+
+EMPLOYEE_KEY = "better_project:active_timers:employee:{0}"
+TASK_KEY = "better_project:active_timers:task:{0}"
+
+# Upper bound on how long a missed invalidation can leave a stale entry
+CACHE_TTL = 30 * 60
+
+
+def get_employee_timers(employee):
+    """Open time logs of an employee, newest first"""
+    if not employee:
+        return []
+    return _get(EMPLOYEE_KEY.format(employee), lambda: queries.get_open_time_logs(employee=employee))
+
+
+def get_task_timers(task):
+    """Open time logs of a task across all employees, newest first"""
+    if not task:
+        return []
+    return _get(TASK_KEY.format(task), lambda: queries.get_open_time_logs(task=task))
+
+
+def get_active_timer(employee, task=None):
+    """Newest open time log of an employee, optionally limited to one task"""
+    for timer in get_employee_timers(employee):
+        if timer.task and (not task or timer.task == task):
+            return timer
+    return None
+
+
+def get_active_timer_summary(employee):
+    """Task, subject and start time of the employee's running timer, as the navbar shows it"""
+    timer = get_active_timer(employee) if employee else None
+    if not timer:
+        return None
+    return {
+        "task": timer.task,
+        "subject": frappe.get_cached_value("Task", timer.task, "subject"),
+        "start_time": str(get_datetime(timer.from_time))
+    }
+
+
+def extend_bootinfo(bootinfo):
+    """Desk boot: the session user's running timer, so the navbar needs no request to show it"""
+    bootinfo.better_project_active_timer = get_active_timer_summary(employee_context.get_employee())
+
+
+def invalidate(employee=None, tasks=None):
+    """Drop registry keys once the current transaction commits"""
+    keys = []
+    if employee:
+        keys.append(EMPLOYEE_KEY.format(employee))
+    keys.extend(TASK_KEY.format(task) for task in set(tasks or []) if task)
+    if not keys:
+        return
+
+    def _drop():
+        for key in keys:
+            frappe.cache().delete_value(key)
+
+    generations.bump(*keys)
+    frappe.db.after_commit.add(_drop)
+    team_board.invalidate()
+    if employee:
+        navbar_versions.bump(navbar_versions.employee_scope(employee))
+
+
+def clear():
+    """Drop the whole registry; it is rebuilt lazily on the next read"""
+    frappe.cache().delete_keys("better_project:active_timers:")
+
+
+def on_timesheet_change(doc, method=None):
+    """Timesheet doc event: keep the registry in line with desk edits"""
+    invalidate(doc.employee, [log.task for log in doc.get("time_logs", [])])
+
+
+def _get(key, load):
+    # Read before the query: a change committed after it makes this fill stale
+    generation = generations.get(key)[0]
+    cached = frappe.cache().get_value(key)
+    if isinstance(cached, tuple) and cached[0] == generation:
+        return cached[1]
+
+    timers = load()
+    frappe.cache().set_value(key, (generation, timers), expires_in_sec=CACHE_TTL)
+    return timers
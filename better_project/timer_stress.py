@@ -0,0 +1,118 @@
+"""Threaded stress test for timer switching.
+
+Several threads act as browser tabs of one user and call
+``api.task_timer.start_timer`` on random tasks as fast as they can. Afterwards
+the site is checked for the invariants the employee lock guarantees: at most
+one open task timer per employee and at most one timesheet per employee for
+today. The switch rate is reported so runs on different revisions can be
+compared.
+
+Run it against a test site with
+``bench --site <site> stress-timer-switch --user <user>``; it leaves the
+employee's timers closed but keeps the time logs it created.
+"""
+
+import random
+import threading
+import time
+
+import frappe
+from frappe.utils import getdate
+
+
+def run(site, user, threads=4, iterations=25, task_count=5):
+    """Run the stress test and return a summary dict"""
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        employee = frappe.db.get_value("Employee", {"user_id": user})
+        if not employee:
+            frappe.throw(f"کارمندی برای کاربر {user} پیدا نشد")
+        tasks = frappe.get_all(
+            "Task",
+            filters={"status": ["!=", "Completed"], "project": ["is", "set"]},
+            pluck="name",
+            limit=task_count
+        )
+        if not tasks:
+            frappe.throw("هیچ تسک بازی با پروژه برای آزمون پیدا نشد")
+    finally:
+        frappe.destroy()
+
+    errors = []
+    switches = [0] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(index):
+        frappe.init(site=site)
+        frappe.connect()
+        frappe.set_user(user)
+        try:
+            from better_project.api.task_timer import start_timer
+
+            barrier.wait()
+            for _ in range(iterations):
+                result = start_timer(random.choice(tasks))
+                if result.get("success"):
+                    switches[index] += 1
+                else:
+                    errors.append(result.get("error"))
+        finally:
+            frappe.destroy()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        violations = check_invariants(employee)
+
+        from better_project import timers
+
+        timers.close_open_timers(employee=employee)
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+    return {
+        "switches": sum(switches),
+        "errors": errors,
+        "seconds": elapsed,
+        "switches_per_second": sum(switches) / elapsed if elapsed else 0,
+        "violations": violations
+    }
+
+
+def check_invariants(employee):
+    """Return a description of every broken timer invariant for an employee"""
+    violations = []
+
+    open_logs = frappe.db.sql("""
+        SELECT COUNT(*)
+        FROM `tabTimesheet` ts
+        JOIN `tabTimesheet Detail` td ON td.parent = ts.name
+        WHERE ts.employee = %s
+        AND ts.docstatus = 0
+        AND td.to_time IS NULL
+        AND td.task IS NOT NULL
+    """, (employee,))[0][0]
+    if open_logs > 1:
+        violations.append(f"{open_logs} open task timers")
+
+    today = getdate()
+    timesheets = frappe.db.count("Timesheet", {
+        "employee": employee,
+        "start_date": ["<=", today],
+        "end_date": [">=", today],
+        "docstatus": ["!=", 2]
+    })
+    if timesheets > 1:
+        violations.append(f"{timesheets} timesheets for {today}")
+
+    return violations
@@ -0,0 +1,135 @@
+"""Opening and closing time logs.
+
+Timer changes of one employee are serialized with ``lock_employee``, a row
+lock on the Employee held until the transaction commits, so a switch (close
+the running logs, find or create today's timesheet, open the new log) runs as
+one transaction and two concurrent clicks cannot both open a timer. Every
+path that stops timers (switching tasks, stopping one, completing a
+task, admin tools) goes through ``close_open_timers``: the open logs are read
+and locked with one SELECT, closed with one UPDATE that computes their hours
+in SQL, then added to the daily rollup and their timesheets' total hours and
+dropped from the registry. Timesheet amounts are recomputed in the
+background.
+
+``auto_close_stale_timers`` runs hourly and caps, in batches, the open logs
+nobody will stop: placeholder logs without a task (closed at their start, with
+no hours) and logs open longer than ``better_project_timer_max_hours`` from
+site_config (default ``MAX_HOURS``). With
+``better_project_timer_close_at_midnight: 1`` logs left running past midnight
+are also closed at the end of their day; by default work past midnight is
+kept up to the max hours. Each batch locks its employees in name order before
+their logs, the same order as the timer endpoints, so the job cannot deadlock
+with them. Capped logs get ``AUTO_CLOSE_NOTE`` in their description.
+"""
+
+from datetime import timedelta
+
+import frappe
+from frappe.utils import cint, flt, get_datetime, now_datetime
+
+from better_project import queries, recompute, time_rollup, time_totals, timer_registry
+
+MAX_HOURS = 12
+AUTO_CLOSE_NOTE = "(بسته شده به صورت خودکار)"
+
+
+def lock_employee(employee):
+    """Serialize timer changes of an employee until the current transaction ends"""
+    if not queries.lock_employee(employee):
+        frappe.throw(f"کارمند {employee} پیدا نشد", frappe.DoesNotExistError)
+
+
+def close_open_timers(employee=None, task=None, task_logs_only=False, to_time=None):
+    """Close every open time log of an employee and/or a task
+
+    Returns the closed logs, newest first, as dicts with ``time_log``,
+    ``timesheet``, ``employee``, ``task``, ``project``, ``from_time``,
+    ``to_time``, ``hours`` and the task ``subject``.
+    """
+    if not (employee or task):
+        return []
+
+    to_time = get_datetime(to_time or now_datetime())
+    logs = queries.lock_open_time_logs(to_time, employee, task, task_logs_only)
+    if not logs:
+        return []
+
+    queries.close_time_logs([log.time_log for log in logs], to_time)
+    for log in logs:
+        log.to_time = to_time
+
+    _record_closed(logs)
+    return logs
+
+
+def close_stale_timers(now=None, max_hours=None, close_at_midnight=None):
+    """Cap every stale open time log; returns the number of capped logs per reason
+
+    Each batch of ``queries.STALE_BATCH_SIZE`` logs is committed on its own.
+    """
+    now = get_datetime(now or now_datetime())
+    if max_hours is None:
+        max_hours = flt(frappe.conf.get("better_project_timer_max_hours")) or MAX_HOURS
+    if close_at_midnight is None:
+        close_at_midnight = frappe.conf.get("better_project_timer_close_at_midnight", 0)
+    max_seconds = int(max_hours * 3600)
+    midnight = cint(close_at_midnight)
+
+    capped = {"missing_task": 0, "midnight": 0, "max_hours": 0}
+    while True:
+        employees = queries.get_stale_time_log_employees(now, max_seconds, midnight)
+        if not employees:
+            break
+
+        # Employee rows first, then their logs, like every timer change
+        queries.lock_employees(employees)
+        logs = queries.lock_stale_time_logs(now, max_seconds, midnight, employees)
+        if not logs:
+            # Closed by their owners in the meantime; the next run picks up the rest
+            frappe.db.rollback()
+            break
+
+        queries.cap_time_logs([log.time_log for log in logs], now, max_seconds, midnight, AUTO_CLOSE_NOTE)
+        for log in logs:
+            log.to_time = get_datetime(log.to_time)
+            log.hours = (log.to_time - get_datetime(log.from_time)).total_seconds() / 3600
+            capped[_stale_reason(log, now, max_seconds)] += 1
+
+        _record_closed(logs)
+        frappe.db.commit()
+
+    return capped
+
+
+def auto_close_stale_timers():
+    """Scheduler job: cap stale open time logs and log what was capped"""
+    capped = close_stale_timers()
+    if any(capped.values()):
+        frappe.logger("better_project").info(f"Auto-closed stale timers: {capped}")
+
+
+def _stale_reason(log, now, max_seconds):
+    if not log.task:
+        return "missing_task"
+    if log.to_time >= min(now, get_datetime(log.from_time) + timedelta(seconds=max_seconds)):
+        return "max_hours"
+    return "midnight"
+
+
+def _record_closed(logs):
+    """Rollup, totals, registry and recompute bookkeeping of logs that were just closed"""
+    tasks_by_employee = {}
+    hours_by_timesheet = {}
+    for log in logs:
+        log.hours = flt(log.hours)
+        log.subject = frappe.get_cached_value("Task", log.task, "subject") if log.task else None
+        time_rollup.add_time_log(log.employee, log.task, log.project, log.from_time, log.to_time, log.hours)
+        tasks_by_employee.setdefault(log.employee, []).append(log.task)
+        hours_by_timesheet[log.timesheet] = hours_by_timesheet.get(log.timesheet, 0) + log.hours
+
+    for log_employee, tasks in tasks_by_employee.items():
+        timer_registry.invalidate(log_employee, tasks)
+
+    for timesheet, hours in hours_by_timesheet.items():
+        time_totals.add_timesheet_hours(timesheet, hours)
+        recompute.schedule_timesheet(timesheet)